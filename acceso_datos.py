@@ -0,0 +1,132 @@
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+from database import Database, RUTA_DB, PERFIL_POR_DEFECTO
+
+
+class AccesoDatos:
+    """Ejecuta operaciones de Database en un hilo propio, fuera del bucle de Tk
+
+    El hilo abre su propia conexión (con WAL, lecturas y escrituras de otras
+    conexiones no se bloquean entre sí) y atiende las peticiones en orden, así
+    que una lectura pedida después de una escritura ya ve el cambio.
+
+    Las peticiones con la misma clave se agrupan: si llega una nueva antes de
+    que se atienda o se entregue la anterior, la anterior se descarta. Sirve
+    para lecturas que quedan obsoletas (búsqueda al teclear, paciente mostrado);
+    las escrituras no deben llevar clave.
+    """
+
+    def __init__(self, ejecutar_en_ui, ruta_db=RUTA_DB, perfil=PERFIL_POR_DEFECTO):
+        self.ejecutar_en_ui = ejecutar_en_ui
+        self.cola = queue.Queue()
+        self.ultimas = {}  # clave -> número de la petición más reciente
+        self.numeros = itertools.count()
+        # Los archivos de las fotos eliminadas se borran en otro hilo, sin frenar este
+        self.borrador = BorradorArchivos(ruta_db, perfil)
+        self.hilo = threading.Thread(target=self._trabajar, args=(ruta_db, perfil), daemon=True)
+        self.hilo.start()
+
+    def pedir(self, funcion, *args, al_terminar=None, al_fallar=None, clave=None):
+        """Encolar funcion(db, *args) y devolver un Future con su resultado
+
+        funcion suele ser un método sin enlazar (Database.obtener_paciente) o una
+        función que agrupa varias operaciones. al_terminar(resultado) y
+        al_fallar(excepcion) se llaman en el hilo de Tk.
+        """
+        futuro = Future()
+        numero = next(self.numeros)
+        if clave is not None:
+            self.ultimas[clave] = numero
+        self.cola.put((numero, clave, funcion, args, futuro, al_terminar, al_fallar))
+        return futuro
+
+    def cerrar(self, espera=2):
+        """Terminar lo encolado, cerrar la conexión del hilo y pararlo"""
+        self.cola.put(None)
+        self.hilo.join(espera)
+        self.borrador.cerrar(espera)
+
+    def _superada(self, numero, clave):
+        return clave is not None and self.ultimas.get(clave) != numero
+
+    def _trabajar(self, ruta_db, perfil):
+        # La conexión se crea en este hilo: sqlite3 no permite usarla desde otro
+        db = Database(ruta_db, perfil)
+        db.borrador_archivos = self.borrador
+        try:
+            while True:
+                peticion = self.cola.get()
+                if peticion is None:
+                    break
+                numero, clave, funcion, args, futuro, al_terminar, al_fallar = peticion
+
+                # Ya hay una petición más nueva con la misma clave: no hace falta ejecutarla
+                if self._superada(numero, clave):
+                    futuro.cancel()
+                    continue
+                if not futuro.set_running_or_notify_cancel():
+                    continue
+
+                try:
+                    futuro.set_result(funcion(db, *args))
+                except Exception as e:
+                    futuro.set_exception(e)
+                self.ejecutar_en_ui(self._entregar, numero, clave, futuro, al_terminar, al_fallar)
+        finally:
+            db.cerrar_conexion()
+
+    def _entregar(self, numero, clave, futuro, al_terminar, al_fallar):
+        """Llamar al callback en el hilo de Tk, salvo que la petición haya quedado superada"""
+        if self._superada(numero, clave):
+            return
+        error = futuro.exception()
+        if error is not None:
+            if al_fallar:
+                al_fallar(error)
+            else:
+                print(f"Error en operación de base de datos: {error}")
+        elif al_terminar:
+            al_terminar(futuro.result())
+
+
+class BorradorArchivos:
+    """Borra en un hilo propio los archivos de fotos que quedaron sin uso
+
+    Las bajas solo anotan los archivos en la tabla archivos_por_borrar, en la
+    misma transacción que borra las filas; este hilo los borra después con su
+    propia conexión. Al arrancar, y cada intervalo segundos, repasa la tabla:
+    lo que quedó pendiente por un cierre o una caída se borra entonces.
+    """
+
+    def __init__(self, ruta_db=RUTA_DB, perfil=PERFIL_POR_DEFECTO, intervalo=300):
+        self.intervalo = intervalo
+        self.aviso = threading.Event()
+        self.parar = False
+        self.hilo = threading.Thread(target=self._trabajar, args=(ruta_db, perfil), daemon=True)
+        self.hilo.start()
+
+    def avisar(self):
+        """Hay archivos nuevos anotados (se llama tras confirmar la transacción)"""
+        self.aviso.set()
+
+    def cerrar(self, espera=2):
+        """Terminar la pasada en curso y parar; lo que falte queda anotado para la próxima vez"""
+        self.parar = True
+        self.aviso.set()
+        self.hilo.join(espera)
+
+    def _trabajar(self, ruta_db, perfil):
+        db = Database(ruta_db, perfil)
+        try:
+            while not self.parar:
+                self.aviso.clear()
+                try:
+                    while not self.parar and db.borrar_archivos_pendientes(limite=100):
+                        pass
+                except Exception as e:
+                    print(f"Error borrando archivos pendientes: {e}")
+                self.aviso.wait(self.intervalo)
+        finally:
+            db.cerrar_conexion()
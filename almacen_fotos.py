@@ -0,0 +1,133 @@
+import hashlib
+import os
+import tempfile
+from imagenes import generar_variantes, rutas_variantes
+
+# Almacén direccionado por contenido: cada foto se guarda una sola vez con el
+# SHA-256 de su contenido como nombre (sin extensión: el mismo contenido subido
+# como .jpg y .jpeg es un único archivo), repartida en subcarpetas por prefijo
+# (data/fotos/almacen/ab/cd/abcd....) para que ninguna carpeta crezca demasiado.
+# Las filas de fotos guardan el hash; un archivo se borra cuando ya ninguna lo usa.
+# Las variantes se nombran a partir del archivo del almacén, así que todas las
+# fotos con el mismo contenido comparten también miniatura y versión de visor.
+CARPETA_ALMACEN = 'data/fotos/almacen'
+TAMANO_BLOQUE = 1024 * 1024
+
+
+def ruta_en_almacen(hash_archivo):
+    """Ruta de un contenido dentro del almacén"""
+    return f"{CARPETA_ALMACEN}/{hash_archivo[:2]}/{hash_archivo[2:4]}/{hash_archivo}"
+
+
+def _buscar_en_almacen(hash_archivo):
+    """Ruta del archivo que ya guarda este contenido, o None
+
+    Los archivos guardados antes de quitar la extensión del nombre se siguen
+    usando (abcd....jpg) para no tener dos copias del mismo contenido.
+    """
+    ruta = ruta_en_almacen(hash_archivo)
+    if os.path.exists(ruta):
+        return ruta
+    carpeta = os.path.dirname(ruta)
+    if os.path.isdir(carpeta):
+        for nombre in os.listdir(carpeta):
+            if os.path.splitext(nombre)[0] == hash_archivo:
+                return f"{carpeta}/{nombre}"
+    return None
+
+
+def guardar_foto(ruta_origen):
+    """Copiar una foto al almacén calculando su hash en la misma pasada
+
+    Se lee el origen una sola vez, por bloques, escribiendo a un temporal en
+    el propio almacén (mismo disco, así el renombrado final es atómico). Si el
+    contenido ya estaba, el temporal se descarta y no se duplica nada.
+    Devuelve (hash, ruta, nueva) donde nueva indica si el archivo no existía.
+    """
+    os.makedirs(CARPETA_ALMACEN, exist_ok=True)
+    resumen = hashlib.sha256()
+
+    descriptor, temporal = tempfile.mkstemp(dir=CARPETA_ALMACEN, suffix='.tmp')
+    try:
+        with open(ruta_origen, 'rb') as origen, os.fdopen(descriptor, 'wb') as destino:
+            while True:
+                bloque = origen.read(TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                resumen.update(bloque)
+                destino.write(bloque)
+
+        hash_archivo = resumen.hexdigest()
+        existente = _buscar_en_almacen(hash_archivo)
+        if existente:
+            os.remove(temporal)
+            return hash_archivo, existente, False
+
+        ruta = ruta_en_almacen(hash_archivo)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        os.replace(temporal, ruta)
+        return hash_archivo, ruta, True
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def preparar_foto(ruta_origen):
+    """Guardar una foto en el almacén y dejar listas sus variantes, sin tocar la base de datos
+
+    Pensado para un ProcessPoolExecutor (subida de varias fotos a la vez).
+    Devuelve (hash, ruta, nueva, ruta_miniatura, ruta_visor).
+    """
+    hash_archivo, ruta, nueva = guardar_foto(ruta_origen)
+    variantes = rutas_variantes(ruta)
+    if nueva or not all(os.path.exists(variante) for variante in variantes):
+        variantes = generar_variantes(ruta)
+    return (hash_archivo, ruta, nueva, *variantes)
+
+
+def eliminar_archivos(rutas):
+    """Borrar archivos del disco ignorando los que ya no existen"""
+    for ruta in rutas:
+        try:
+            if ruta and os.path.exists(ruta):
+                os.remove(ruta)
+        except OSError as e:
+            print(f"No se pudo borrar {ruta}: {e}")
+
+
+def migrar_fotos_antiguas(db):
+    """Pasar al almacén las fotos guardadas como data/fotos/{paciente}_{nombre}"""
+    fotos = db.obtener_fotos_sin_hash()
+    pendientes = {}  # ruta antigua -> filas que todavía la usan
+    for _, ruta_archivo, _, _ in fotos:
+        pendientes[ruta_archivo] = pendientes.get(ruta_archivo, 0) + 1
+
+    migradas = 0
+    for foto_id, ruta_archivo, miniatura_antigua, visor_antiguo in fotos:
+        pendientes[ruta_archivo] -= 1
+        try:
+            hash_archivo, ruta, _ = guardar_foto(ruta_archivo)
+            variantes = rutas_variantes(ruta)
+            if not all(os.path.exists(variante) for variante in variantes):
+                variantes = generar_variantes(ruta)
+            db.actualizar_archivo_foto(foto_id, ruta, hash_archivo, *variantes)
+            migradas += 1
+        except Exception as e:
+            print(f"Error migrando foto {foto_id} ({ruta_archivo}): {e}")
+            continue
+        # El archivo antiguo y sus variantes se borran al pasar la última fila que los usaba
+        if not pendientes[ruta_archivo]:
+            eliminar_archivos([ruta_archivo, miniatura_antigua, visor_antiguo])
+    print(f"Fotos migradas al almacén: {migradas} de {len(fotos)}")
+    return migradas
+
+
+# Mover al almacén las fotos subidas antes de que existiera:
+#   python almacen_fotos.py
+if __name__ == "__main__":
+    from database import Database
+
+    db = Database()
+    migrar_fotos_antiguas(db)
+    db.cerrar_conexion()
@@ -1,84 +1,177 @@
-import sqlite3
 import re
+import os
+import threading
+import unicodedata
+from pathlib import Path
 from datetime import datetime, timedelta
+import instrumentacion
+
+AYUDA = "Puedo ayudarte con:\n• Contar pacientes por semana\n• Última visita de un paciente\n• Próximas citas\n• Buscar por etiquetas\n• Estadísticas generales"
+
+# Entidades: se buscan sobre la pregunta original (con acentos) para no
+# alterar nombres de pacientes ni etiquetas
+PATRON_NOMBRE = re.compile(r'paciente\s+(\w+)')
+PATRON_ETIQUETA = re.compile(r'(?:etiqueta|con|tienen)\s+(\w+)')
+PATRON_FECHA = re.compile(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})')
+PATRON_SEMANA_PASADA = re.compile(r'semana pasada|ultima semana')
+
+
+def quitar_acentos(texto):
+    """Quitar tildes y diéresis para comparar sin depender de cómo se escriba"""
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+class Intencion:
+    """Tipo de pregunta que sabe responder el asistente"""
+    
+    def __init__(self, nombre, claves, prioridad, manejador):
+        self.nombre = nombre
+        self.claves = claves          # Patrones que deben aparecer todos
+        self.prioridad = prioridad
+        self.manejador = manejador    # Nombre del método de AsistenteIA
+
+
+INTENCIONES = []
+
+
+def intencion(nombre, *claves, prioridad=0):
+    """Decorador para registrar un método de AsistenteIA como intención"""
+    def registrar(metodo):
+        INTENCIONES.append(Intencion(nombre, claves, prioridad, metodo.__name__))
+        return metodo
+    return registrar
+
+
+def compilar_intenciones(intenciones):
+    """Compilar una vez las claves de todas las intenciones
+    
+    Cada clave tiene su propio patrón: en una sola alternancia, claves que
+    empiezan en la misma posición se taparían entre sí ("pacientes" ocultaría
+    "pacientes con"). Devuelve [(patrón, (índice de intención, índice de clave))].
+    """
+    return [
+        (re.compile(clave), (i, j))
+        for i, intencion_ in enumerate(intenciones)
+        for j, clave in enumerate(intencion_.claves)
+    ]
+
 
 class AsistenteIA:
-    def __init__(self, db_path='data/podologia.db'):
+    def __init__(self, db_path=os.environ.get('PODOLOGIA_DB', 'data/podologia.db')):
         self.db_path = db_path
+        self.conn = None
+        # La conexión se comparte entre hilos, pero solo una pregunta a la vez
+        self.bloqueo = threading.Lock()
+    
+    def conectar(self):
+        """Abrir una sola vez la conexión de solo lectura y reutilizarla"""
+        if self.conn is None:
+            uri = Path(self.db_path).absolute().as_uri() + '?mode=ro'
+            self.conn = instrumentacion.conectar(uri, 'asistente', uri=True, timeout=5, check_same_thread=False)
+        return self.conn
+    
+    def cerrar(self):
+        """Cerrar la conexión de solo lectura"""
+        with self.bloqueo:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
     
     def procesar_pregunta(self, pregunta):
         """Procesa preguntas naturales y devuelve respuestas"""
         pregunta = pregunta.lower().strip()
+        intencion, _, entidades = self.clasificar(pregunta)
         
-        # Conexión a la base de datos
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.bloqueo:
+            cursor = self.conectar().cursor()
+            try:
+                if intencion is None:
+                    return AYUDA
+                return getattr(self, intencion.manejador)(entidades, cursor)
+            finally:
+                cursor.close()
+    
+    def clasificar(self, pregunta):
+        """Devolver (intención, puntuación, entidades) con los patrones ya compilados
         
-        try:
-            # Patrón: "cuántos pacientes" + "semana"
-            if re.search(r'cuántos pacientes|cuantos pacientes', pregunta) and re.search(r'semana', pregunta):
-                return self._contar_pacientes_semana(pregunta, cursor)
-            
-            # Patrón: "última vez" + nombre paciente
-            elif re.search(r'última vez|ultima vez|cuándo vino|cuando vino', pregunta):
-                return self._ultima_visita(pregunta, cursor)
-            
-            # Patrón: "próximas citas"
-            elif re.search(r'próximas citas|proximas citas|citas de hoy', pregunta):
-                return self._proximas_citas(cursor)
-            
-            # Patrón: "pacientes con" + etiqueta
-            elif re.search(r'pacientes con|etiqueta', pregunta):
-                return self._buscar_por_etiqueta(pregunta, cursor)
-            
-            # Patrón: "estadísticas" o "resumen"
-            elif re.search(r'estadísticas|estadisticas|resumen', pregunta):
-                return self._estadisticas_generales(cursor)
-            
-            else:
-                return "Puedo ayudarte con:\n• Contar pacientes por semana\n• Última visita de un paciente\n• Próximas citas\n• Buscar por etiquetas\n• Estadísticas generales"
-                
-        finally:
-            conn.close()
+        La intención es None si ninguna encaja.
+        """
+        pregunta = pregunta.lower().strip()
+        
+        # Qué claves de qué intenciones aparecen (los patrones no llevan acentos)
+        sin_acentos = quitar_acentos(pregunta)
+        encontradas = {posicion for patron, posicion in CLAVES_INTENCIONES if patron.search(sin_acentos)}
+        
+        mejor, mejor_puntuacion = None, None
+        for indice, intencion in enumerate(INTENCIONES):
+            # Una intención encaja si aparecen todas sus claves
+            if all((indice, clave) in encontradas for clave in range(len(intencion.claves))):
+                puntuacion = (intencion.prioridad, len(intencion.claves))
+                if mejor_puntuacion is None or puntuacion > mejor_puntuacion:
+                    mejor, mejor_puntuacion = intencion, puntuacion
+        
+        return mejor, mejor_puntuacion, self._extraer_entidades(pregunta)
+    
+    def _extraer_entidades(self, pregunta):
+        """Extraer una sola vez nombre de paciente, etiqueta y rango de fechas"""
+        entidades = {'nombre': None, 'etiqueta': None, 'semana': None, 'fecha_no_valida': None}
+        
+        nombre_match = PATRON_NOMBRE.search(pregunta)
+        if nombre_match:
+            entidades['nombre'] = nombre_match.group(1)
+        
+        etiqueta_match = PATRON_ETIQUETA.search(pregunta)
+        if etiqueta_match:
+            entidades['etiqueta'] = etiqueta_match.group(1)
+        
+        # Semana (de lunes a domingo): la de la fecha indicada, la pasada o la actual
+        hoy = datetime.now()
+        fecha_match = PATRON_FECHA.search(pregunta)
+        if fecha_match:
+            dia, mes, año = fecha_match.groups()
+            try:
+                fecha = datetime(int(año), int(mes), int(dia))
+            except ValueError:
+                # Fecha imposible (31/02): semana queda en None y lo dice quien la use
+                entidades['fecha_no_valida'] = fecha_match.group(0)
+                return entidades
+            inicio = fecha - timedelta(days=fecha.weekday())
+        elif PATRON_SEMANA_PASADA.search(quitar_acentos(pregunta)):
+            inicio = hoy - timedelta(days=hoy.weekday() + 7)
+        else:
+            inicio = hoy - timedelta(days=hoy.weekday())
+        entidades['semana'] = (inicio.strftime("%Y-%m-%d"), (inicio + timedelta(days=6)).strftime("%Y-%m-%d"))
+        
+        return entidades
+    
+    # --- INTENCIONES ---
+    # Cada manejador se registra con las claves que deben aparecer en la pregunta.
+    # A igual coincidencia gana la de mayor prioridad.
     
-    def _contar_pacientes_semana(self, pregunta, cursor):
+    @intencion('contar_semana', r'cuantos pacientes', r'semana', prioridad=50)
+    def _contar_pacientes_semana(self, entidades, cursor):
         """Cuenta pacientes por semana"""
+        if entidades['fecha_no_valida']:
+            return f"Fecha no válida: {entidades['fecha_no_valida']}"
         try:
-            # Buscar fecha en la pregunta
-            fecha_match = re.search(r'(\d{1,2})[/-](\d{1,2})[/-](\d{4})', pregunta)
-            if fecha_match:
-                dia, mes, año = fecha_match.groups()
-                fecha_inicio = f"{año}-{mes:0>2}-{dia:0>2}"
-            else:
-                # Semana actual por defecto
-                hoy = datetime.now()
-                fecha_inicio = (hoy - timedelta(days=hoy.weekday())).strftime("%Y-%m-%d")
+            fecha_inicio, fecha_fin = entidades['semana']
             
-            fecha_fin = (datetime.strptime(fecha_inicio, "%Y-%m-%d") + timedelta(days=6)).strftime("%Y-%m-%d")
-            
-            cursor.execute('''
-                SELECT COUNT(DISTINCT paciente_id) 
-                FROM citas 
-                WHERE fecha BETWEEN ? AND ?
-            ''', (fecha_inicio, fecha_fin))
-            
-            resultado = cursor.fetchone()[0]
+            # Resumen semanal mantenido por triggers (la clave es el lunes)
+            resultado = self._estadisticas_periodo(cursor, 'semana', fecha_inicio)[1]
             return f"En la semana del {fecha_inicio} al {fecha_fin} hubo {resultado} pacientes"
             
         except Exception as e:
             return f"Error al contar pacientes: {str(e)}"
     
-    def _ultima_visita(self, pregunta, cursor):
+    @intencion('ultima_visita', r'ultima vez|cuando vino', prioridad=40)
+    def _ultima_visita(self, entidades, cursor):
         """Encuentra la última visita de un paciente"""
-        # Extraer nombre del paciente
-        nombre_match = re.search(r'paciente\s+(\w+)', pregunta)
-        if not nombre_match:
+        nombre_paciente = entidades['nombre']
+        if not nombre_paciente:
             return "¿De qué paciente quieres saber la última visita? Ej: 'última vez del paciente Juan'"
         
-        nombre_paciente = nombre_match.group(1)
-        
         cursor.execute('''
-            SELECT p.nombre, MAX(c.fecha) 
+            SELECT p.nombre, MAX(c.fecha_hora) 
             FROM citas c 
             JOIN pacientes p ON c.paciente_id = p.id 
             WHERE p.nombre LIKE ? 
@@ -91,7 +184,8 @@ class AsistenteIA:
         else:
             return f"No se encontraron visitas para pacientes que coincidan con '{nombre_paciente}'"
     
-    def _proximas_citas(self, cursor):
+    @intencion('proximas_citas', r'proximas citas|citas de hoy', prioridad=30)
+    def _proximas_citas(self, entidades, cursor):
         """Muestra las próximas citas"""
         hoy = datetime.now().strftime("%Y-%m-%d")
         
@@ -99,8 +193,8 @@ class AsistenteIA:
             SELECT p.nombre, c.fecha, c.tratamiento 
             FROM citas c 
             JOIN pacientes p ON c.paciente_id = p.id 
-            WHERE c.fecha >= ? 
-            ORDER BY c.fecha 
+            WHERE c.fecha_hora >= ? 
+            ORDER BY c.fecha_hora 
             LIMIT 5
         ''', (hoy,))
         
@@ -113,19 +207,19 @@ class AsistenteIA:
         else:
             return "No hay próximas citas programadas"
     
-    def _buscar_por_etiqueta(self, pregunta, cursor):
+    @intencion('buscar_etiqueta', r'pacientes con|pacientes tienen|etiqueta', prioridad=20)
+    def _buscar_por_etiqueta(self, entidades, cursor):
         """Busca pacientes por etiqueta"""
-        etiqueta_match = re.search(r'etiqueta\s+(\w+)|con\s+(\w+)', pregunta)
-        if not etiqueta_match:
+        etiqueta = entidades['etiqueta']
+        if not etiqueta:
             return "¿Qué etiqueta buscas? Ej: 'pacientes con diabetes'"
         
-        etiqueta = etiqueta_match.group(1) or etiqueta_match.group(2)
-        
         cursor.execute('''
             SELECT DISTINCT p.nombre 
             FROM pacientes p 
-            JOIN etiquetas e ON p.id = e.paciente_id 
-            WHERE e.nombre_etiqueta LIKE ?
+            JOIN etiquetas_pacientes ep ON p.id = ep.paciente_id 
+            JOIN etiquetas_disponibles ed ON ep.etiqueta_id = ed.id 
+            WHERE ed.nombre_etiqueta LIKE ?
         ''', (f'%{etiqueta}%',))
         
         pacientes = cursor.fetchall()
@@ -137,18 +231,37 @@ class AsistenteIA:
         else:
             return f"No hay pacientes con la etiqueta '{etiqueta}'"
     
-    def _estadisticas_generales(self, cursor):
-        """Estadísticas generales de la clínica"""
-        # Total pacientes
-        cursor.execute('SELECT COUNT(*) FROM pacientes')
-        total_pacientes = cursor.fetchone()[0]
-        
-        # Citas este mes
+    @intencion('estadisticas', r'estadisticas|resumen', prioridad=10)
+    def _estadisticas_generales(self, entidades, cursor):
+        """Estadísticas generales de la clínica (leídas de las tablas de resumen)"""
         mes_actual = datetime.now().strftime("%Y-%m")
-        cursor.execute('SELECT COUNT(*) FROM citas WHERE fecha LIKE ?', (f'{mes_actual}%',))
-        citas_mes = cursor.fetchone()[0]
         
-        return f"Estadísticas:\n• Total pacientes: {total_pacientes}\n• Citas este mes: {citas_mes}"
+        total_pacientes = self._estadisticas_periodo(cursor, 'total', 'total')[2]
+        citas_mes, pacientes_mes, nuevos_mes = self._estadisticas_periodo(cursor, 'mes', mes_actual)
+        
+        cursor.execute('''
+            SELECT tratamiento, citas FROM estadisticas_tratamiento
+            WHERE tipo = 'mes' AND periodo = ? AND tratamiento != ''
+            ORDER BY citas DESC
+            LIMIT 3
+        ''', (mes_actual,))
+        tratamientos = cursor.fetchall()
+        
+        respuesta = (f"Estadísticas:\n• Total pacientes: {total_pacientes}\n• Citas este mes: {citas_mes}"
+                     f"\n• Pacientes atendidos este mes: {pacientes_mes}\n• Pacientes nuevos este mes: {nuevos_mes}")
+        if tratamientos:
+            respuesta += "\n• Tratamientos más frecuentes: " + ", ".join(f"{t} ({n})" for t, n in tratamientos)
+        return respuesta
+    
+    def _estadisticas_periodo(self, cursor, tipo, periodo):
+        """(citas, pacientes_distintos, pacientes_nuevos) de estadisticas_periodo"""
+        cursor.execute('''
+            SELECT citas, pacientes_distintos, pacientes_nuevos FROM estadisticas_periodo
+            WHERE tipo = ? AND periodo = ?
+        ''', (tipo, periodo))
+        return cursor.fetchone() or (0, 0, 0)
+
+CLAVES_INTENCIONES = compilar_intenciones(INTENCIONES)
 
 # Pruebas del asistente
 if __name__ == "__main__":
@@ -0,0 +1,398 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from database import Database, VERSION_ESQUEMA
+from asistente_ia import AsistenteIA, INTENCIONES
+from generar_datos import NOMBRES, APELLIDOS, generar_pacientes
+
+# Métodos de Database que no tiene sentido medir (configuración y ciclo de vida)
+NO_MEDIDOS = {'init_db', 'verificar_perfil', 'aplicar_migraciones', 'transaccion', 'cerrar_conexion'}
+
+# Pregunta de ejemplo por intención del asistente; {nombre} se sustituye en cada repetición
+PREGUNTAS = {
+    'contar_semana': "¿Cuántos pacientes hubo esta semana?",
+    'ultima_visita': "¿Cuándo vino el paciente {nombre} por última vez?",
+    'proximas_citas': "¿Qué próximas citas tengo?",
+    'buscar_etiqueta': "¿Qué pacientes tienen diabetes?",
+    'estadisticas': "Estadísticas generales",
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+class Caso:
+    """Operación a medir: funcion(objetivo, contexto) se cronometra en cada repetición
+
+    pesado limita las repeticiones a 3 y quita la llamada de calentamiento
+    (recorridos completos de tablas grandes).
+    """
+
+    def __init__(self, nombre, funcion, pesado=False):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.pesado = pesado
+
+
+class Contexto:
+    """Parámetros aleatorios (con semilla) sacados de la propia base"""
+
+    def __init__(self, db, semilla, ruta_imagen):
+        self.rng = random.Random(semilla)
+        self.ruta_imagen = ruta_imagen
+        self.max_id = db.cursor.execute('SELECT COALESCE(MAX(id), 0) FROM pacientes').fetchone()[0]
+        desde, hasta = db.cursor.execute('SELECT MIN(fecha_hora), MAX(fecha_hora) FROM citas').fetchone()
+        ahora = datetime.now()
+        self.desde = datetime.fromisoformat(desde) if desde else ahora
+        self.hasta = datetime.fromisoformat(hasta) if hasta else ahora
+        self.etiquetas = db.obtener_etiquetas_disponibles()
+        self.fotos = [fila[0] for fila in db.cursor.execute('SELECT id FROM fotos LIMIT 1000')]
+        self.contador = 0
+        self.eliminados = set()
+
+    def paciente_id(self):
+        """Id de un paciente que sigue existiendo (las claves foráneas rechazan los borrados)"""
+        while True:
+            paciente_id = self.rng.randint(1, max(1, self.max_id))
+            if paciente_id not in self.eliminados or len(self.eliminados) >= self.max_id:
+                return paciente_id
+
+    def para_eliminar(self, cantidad=1):
+        """Ids de pacientes que se van a eliminar (no se vuelven a usar en otros casos)"""
+        ids = [self.paciente_id() for _ in range(cantidad)]
+        self.eliminados.update(ids)
+        return ids
+
+    def texto(self):
+        """Texto de búsqueda como lo teclearía un usuario (nombre o prefijo de apellido)"""
+        if self.rng.random() < 0.5:
+            return self.rng.choice(NOMBRES)
+        return self.rng.choice(APELLIDOS)[:self.rng.randint(3, 6)]
+
+    def nombre(self):
+        return f"{self.rng.choice(NOMBRES)} {self.rng.choice(APELLIDOS)}"
+
+    def errata(self):
+        """Nombre con una letra cambiada, como al teclear deprisa"""
+        nombre = self.nombre()
+        i = self.rng.randrange(len(nombre))
+        return nombre[:i] + self.rng.choice('aeiourstn') + nombre[i + 1:]
+
+    def fecha(self):
+        segundos = (self.hasta - self.desde).total_seconds()
+        return self.desde + timedelta(seconds=self.rng.uniform(0, max(0, segundos)))
+
+    def etiqueta(self):
+        return self.rng.choice(self.etiquetas) if self.etiquetas else 'diabetes'
+
+    def unico(self, prefijo):
+        self.contador += 1
+        return f"{prefijo} {self.contador}"
+
+
+def _casos_database():
+    """Un caso por método público de Database"""
+    return [
+        Caso('agregar_paciente', lambda db, c: db.agregar_paciente(c.nombre(), "600000000", "bench@ejemplo.com")),
+        Caso('obtener_paciente', lambda db, c: db.obtener_paciente(c.paciente_id())),
+        Caso('obtener_pacientes', lambda db, c: db.obtener_pacientes(), pesado=True),
+        Caso('obtener_pacientes(despues)', lambda db, c: db.obtener_pacientes(despues=(c.nombre(), 0), limite=500)),
+        Caso('recorrer_pacientes', lambda db, c: sum(1 for _ in db.recorrer_pacientes()), pesado=True),
+        Caso('contar_pacientes', lambda db, c: db.contar_pacientes()),
+        Caso('contar_pacientes(texto)', lambda db, c: db.contar_pacientes(c.texto())),
+        Caso('obtener_pacientes_pagina', lambda db, c: db.obtener_pacientes_pagina(limite=200)),
+        Caso('obtener_pacientes_pagina(texto)', lambda db, c: db.obtener_pacientes_pagina(c.texto(), limite=200)),
+        Caso('obtener_pacientes_pagina(despues)',
+             lambda db, c: db.obtener_pacientes_pagina(despues=(c.nombre(), 0), limite=100)),
+        Caso('buscar_paciente', lambda db, c: db.buscar_paciente(c.texto())),
+        Caso('buscar_por_nombre', lambda db, c: db.buscar_por_nombre(c.texto())),
+        Caso('buscar_por_nombre(errata)', lambda db, c: db.buscar_por_nombre(c.errata())),
+        Caso('agregar_cita', lambda db, c: db.agregar_cita(c.paciente_id(), c.fecha().strftime("%Y-%m-%d %H:%M"),
+                                                           "Benchmark", "Revisión")),
+        Caso('obtener_citas_paciente', lambda db, c: db.obtener_citas_paciente(c.paciente_id())),
+        Caso('obtener_citas_paciente(despues)', lambda db, c: db.obtener_citas_paciente(
+            c.paciente_id(), despues=(c.fecha().strftime("%Y-%m-%d %H:%M:%S"), 0), limite=20)),
+        Caso('recorrer_citas_paciente', lambda db, c: sum(1 for _ in db.recorrer_citas_paciente(c.paciente_id()))),
+        Caso('obtener_citas_fecha(dia)', lambda db, c: db.obtener_citas_fecha(c.fecha().strftime("%Y-%m-%d"))),
+        Caso('obtener_citas_fecha(mes)', lambda db, c: db.obtener_citas_fecha(c.fecha().strftime("%Y-%m"))),
+        Caso('obtener_citas_rango', lambda db, c: db.obtener_citas_rango(c.fecha(), c.fecha() + timedelta(days=7))),
+        Caso('obtener_citas_rango(paciente)', lambda db, c: db.obtener_citas_rango(
+            c.desde, c.hasta + timedelta(days=1), c.paciente_id())),
+        Caso('agregar_foto', lambda db, c: db.agregar_foto(c.paciente_id(), c.ruta_imagen, "Benchmark")),
+        Caso('agregar_fotos(10)', lambda db, c: db.agregar_fotos(
+            c.paciente_id(), [(None, c.ruta_imagen, None, None)] * 10, "Benchmark")),
+        Caso('contar_referencias_foto', lambda db, c: db.contar_referencias_foto(f"{c.paciente_id():064x}")),
+        Caso('obtener_fotos_sin_hash', lambda db, c: db.obtener_fotos_sin_hash(), pesado=True),
+        Caso('actualizar_archivo_foto', lambda db, c: db.actualizar_archivo_foto(
+            c.rng.choice(c.fotos) if c.fotos else 0, c.ruta_imagen, None, None, None)),
+        Caso('obtener_fotos_sin_variantes', lambda db, c: db.obtener_fotos_sin_variantes(), pesado=True),
+        Caso('actualizar_variantes_foto', lambda db, c: db.actualizar_variantes_foto(
+            c.rng.choice(c.fotos) if c.fotos else 0, None, None)),
+        Caso('obtener_fotos_paciente', lambda db, c: db.obtener_fotos_paciente(c.paciente_id())),
+        Caso('obtener_fotos_paciente(despues)', lambda db, c: db.obtener_fotos_paciente(
+            c.paciente_id(), despues=(c.fecha().strftime("%Y-%m-%d %H:%M:%S"), 0), limite=20)),
+        Caso('recorrer_fotos_paciente', lambda db, c: sum(1 for _ in db.recorrer_fotos_paciente(c.paciente_id()))),
+        Caso('obtener_etiquetas_disponibles', lambda db, c: db.obtener_etiquetas_disponibles()),
+        Caso('agregar_etiqueta_disponible', lambda db, c: db.agregar_etiqueta_disponible(c.unico('etiqueta'))),
+        Caso('agregar_etiqueta_paciente', lambda db, c: db.agregar_etiqueta_paciente(c.paciente_id(), c.etiqueta())),
+        Caso('sincronizar_etiquetas_paciente', lambda db, c: db.sincronizar_etiquetas_paciente(
+            c.paciente_id(), [c.etiqueta(), c.etiqueta()])),
+        Caso('obtener_etiquetas_paciente', lambda db, c: db.obtener_etiquetas_paciente(c.paciente_id())),
+        Caso('buscar_por_etiqueta', lambda db, c: db.buscar_por_etiqueta(c.etiqueta()), pesado=True),
+        Caso('buscar_por_etiqueta(despues)', lambda db, c: db.buscar_por_etiqueta(
+            c.etiqueta(), despues=(c.nombre(), 0), limite=100)),
+        Caso('recorrer_por_etiqueta', lambda db, c: sum(1 for _ in db.recorrer_por_etiqueta(c.etiqueta())), pesado=True),
+        Caso('eliminar_etiqueta_paciente', lambda db, c: db.eliminar_etiqueta_paciente(c.paciente_id(), c.etiqueta())),
+        Caso('eliminar_paciente', lambda db, c: db.eliminar_paciente(c.para_eliminar()[0])),
+        Caso('eliminar_pacientes(100)', lambda db, c: db.eliminar_pacientes(c.para_eliminar(100)), pesado=True),
+        Caso('borrar_archivos_pendientes', lambda db, c: db.borrar_archivos_pendientes()),
+        Caso('actualizar_paciente', lambda db, c: db.actualizar_paciente(c.paciente_id(), c.nombre(), "611111111")),
+        Caso('reconstruir_estadisticas', lambda db, c: db.reconstruir_estadisticas(), pesado=True),
+        Caso('obtener_estadisticas', lambda db, c: db.obtener_estadisticas('mes', c.fecha().strftime("%Y-%m"))),
+        Caso('importar_pacientes(100)', lambda db, c: db.importar_pacientes(
+            ({k: v for k, v in p.items() if k != 'id'} for p in generar_pacientes(100, c.rng.randrange(10 ** 9))), 100)),
+        Caso('importar_citas(100)', lambda db, c: db.importar_citas(
+            ({'paciente_id': c.paciente_id(), 'fecha': c.fecha().strftime("%Y-%m-%d %H:%M")} for _ in range(100)), 100)),
+    ]
+
+
+def _casos_asistente():
+    """Un caso por intención registrada, más la clasificación sola"""
+    casos = [Caso('ia.clasificar', lambda ia, c: [ia.clasificar(p.format(nombre='juan')) for p in PREGUNTAS.values()])]
+    for intencion in INTENCIONES:
+        pregunta = PREGUNTAS.get(intencion.nombre)
+        if pregunta is None:
+            print(f"Aviso: la intención '{intencion.nombre}' no tiene pregunta de ejemplo en PREGUNTAS")
+            continue
+        casos.append(Caso(
+            f"ia.{intencion.nombre}",
+            lambda ia, c, p=pregunta: ia.procesar_pregunta(p.format(nombre=c.rng.choice(NOMBRES))),
+        ))
+    return casos
+
+
+def comprobar_cobertura():
+    """Avisar de métodos públicos de Database o intenciones sin caso de benchmark"""
+    medidos = {caso.nombre.split('(')[0] for caso in _casos_database()}
+    publicos = {m for m in dir(Database) if not m.startswith('_') and callable(getattr(Database, m))}
+    faltan = sorted(publicos - medidos - NO_MEDIDOS)
+    if faltan:
+        print(f"Aviso: métodos de Database sin caso de benchmark: {', '.join(faltan)}")
+
+    for intencion in INTENCIONES:
+        pregunta = PREGUNTAS.get(intencion.nombre)
+        if pregunta is None:
+            continue
+        elegida = AsistenteIA().clasificar(pregunta.format(nombre='juan'))[0]
+        if elegida is None or elegida.nombre != intencion.nombre:
+            print(f"Aviso: la pregunta de '{intencion.nombre}' se clasifica como "
+                  f"'{elegida.nombre if elegida else None}'")
+
+
+def percentil(muestras, p):
+    """Percentil por rango más cercano (muestras ya ordenadas)"""
+    if not muestras:
+        return None
+    return muestras[max(0, math.ceil(p / 100 * len(muestras)) - 1)]
+
+
+def resumir(muestras):
+    muestras = sorted(muestras)
+    resumen = {f"p{p}": round(percentil(muestras, p), 4) for p in PERCENTILES}
+    resumen['n'] = len(muestras)
+    return resumen
+
+
+def cronometrar(funcion, *args):
+    inicio = time.perf_counter()
+    funcion(*args)
+    return (time.perf_counter() - inicio) * 1000
+
+
+def medir(casos, abrir, cerrar, contexto, repeticiones, repeticiones_frio):
+    """Medir cada caso en frío y en caliente; devuelve {nombre: {'frio': ..., 'caliente': ...}}
+
+    Frío: cada muestra abre una conexión nueva (caché de páginas de SQLite y
+    caché LRU vacías) y mide solo la primera llamada; la caché del sistema
+    operativo no se vacía. Caliente: una conexión, una llamada de calentamiento
+    y luego repeticiones llamadas seguidas.
+    """
+    resultados = {}
+    for caso in casos:
+        n = min(repeticiones, 3) if caso.pesado else repeticiones
+        n_frio = min(repeticiones_frio, 3) if caso.pesado else repeticiones_frio
+
+        frio = []
+        for _ in range(n_frio):
+            objetivo = abrir()
+            try:
+                frio.append(cronometrar(caso.funcion, objetivo, contexto))
+            finally:
+                cerrar(objetivo)
+
+        objetivo = abrir()
+        try:
+            if not caso.pesado:
+                caso.funcion(objetivo, contexto)
+            caliente = [cronometrar(caso.funcion, objetivo, contexto) for _ in range(n)]
+        finally:
+            cerrar(objetivo)
+
+        resultados[caso.nombre] = {'frio': resumir(frio), 'caliente': resumir(caliente)}
+        print(f"  {caso.nombre:<38} frío p50 {resultados[caso.nombre]['frio']['p50']:>9.3f} ms   "
+              f"caliente p50 {resultados[caso.nombre]['caliente']['p50']:>9.3f} ms", flush=True)
+    return resultados
+
+
+def _abrir_database(ruta):
+    # Database informa por consola al abrir; en el benchmark solo molesta
+    with contextlib.redirect_stdout(io.StringIO()):
+        return Database(ruta)
+
+
+def _crear_imagen(ruta):
+    """Foto de prueba de 1600x1200 para medir agregar_foto (genera variantes)"""
+    from PIL import Image
+    Image.new('RGB', (1600, 1200), (200, 160, 140)).save(ruta, 'JPEG', quality=90)
+
+
+def ejecutar(ruta_db, repeticiones=50, repeticiones_frio=10, semilla=1, filtro=None):
+    """Ejecutar todos los casos sobre una copia de ruta_db y devolver el informe"""
+    ruta_db = os.path.abspath(ruta_db)
+    if not os.path.exists(ruta_db):
+        raise FileNotFoundError(f"No existe {ruta_db}; créala con generar_datos.py")
+
+    comprobar_cobertura()
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as carpeta:
+        # Las escrituras se hacen sobre una copia; las variantes de fotos van a su data/
+        copia = os.path.join(carpeta, 'data', 'benchmark.db')
+        os.makedirs(os.path.dirname(copia))
+        with sqlite3.connect(ruta_db) as origen, sqlite3.connect(copia) as destino:
+            origen.backup(destino)
+        imagen = os.path.join(carpeta, 'foto.jpg')
+        _crear_imagen(imagen)
+
+        directorio_anterior = os.getcwd()
+        os.chdir(carpeta)
+        try:
+            db = _abrir_database(copia)
+            try:
+                contexto = Contexto(db, semilla, imagen)
+                pacientes = contexto.max_id
+            finally:
+                db.cerrar_conexion()
+
+            casos_db = [c for c in _casos_database() if not filtro or filtro in c.nombre]
+            casos_ia = [c for c in _casos_asistente() if not filtro or filtro in c.nombre]
+
+            print(f"Database ({len(casos_db)} casos):")
+            resultados = medir(casos_db, lambda: _abrir_database(copia), Database.cerrar_conexion,
+                               contexto, repeticiones, repeticiones_frio)
+            print(f"AsistenteIA ({len(casos_ia)} casos):")
+            resultados.update(medir(casos_ia, lambda: AsistenteIA(copia), AsistenteIA.cerrar,
+                                    contexto, repeticiones, repeticiones_frio))
+        finally:
+            os.chdir(directorio_anterior)
+
+    return {
+        'meta': {
+            'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'base': ruta_db,
+            'pacientes': pacientes,
+            'version_esquema': VERSION_ESQUEMA,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'plataforma': platform.platform(),
+            'repeticiones': repeticiones,
+            'repeticiones_frio': repeticiones_frio,
+            'semilla': semilla,
+        },
+        'resultados': resultados,
+    }
+
+
+def comparar(informe, base, tolerancia=0.25, minimo_ms=0.05):
+    """Devolver las regresiones de informe frente a base
+
+    Hay regresión si p50 o p95 empeoran más de tolerancia (fracción) y además
+    más de minimo_ms, para no saltar por ruido en operaciones de microsegundos.
+    """
+    regresiones = []
+    for nombre, modos in informe['resultados'].items():
+        anterior = base['resultados'].get(nombre)
+        if not anterior:
+            continue
+        for modo, actual in modos.items():
+            for p in ('p50', 'p95'):
+                antes, ahora = anterior.get(modo, {}).get(p), actual.get(p)
+                if antes is None or ahora is None:
+                    continue
+                if antes > 0 and ahora > antes * (1 + tolerancia) and ahora - antes > minimo_ms:
+                    regresiones.append((nombre, modo, p, antes, ahora))
+    return regresiones
+
+
+def imprimir_informe(informe):
+    print(f"\n{'operación':<38} {'modo':<9} {'n':>4} " + ' '.join(f"{'p' + str(p):>10}" for p in PERCENTILES))
+    for nombre, modos in informe['resultados'].items():
+        for modo, r in modos.items():
+            print(f"{nombre:<38} {modo:<9} {r['n']:>4} " + ' '.join(f"{r['p' + str(p)]:>10.3f}" for p in PERCENTILES))
+    print("(tiempos en ms)")
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark de Database y AsistenteIA sobre una base generada")
+    parser.add_argument('ruta', help="base creada con generar_datos.py (se mide sobre una copia)")
+    parser.add_argument('--repeticiones', type=int, default=50, help="muestras en caliente por caso")
+    parser.add_argument('--repeticiones-frio', type=int, default=10, help="muestras en frío por caso")
+    parser.add_argument('--semilla', type=int, default=1, help="semilla de los parámetros de cada llamada")
+    parser.add_argument('--filtro', help="medir solo los casos cuyo nombre contenga este texto")
+    parser.add_argument('--guardar', help="guardar el informe en este JSON (p. ej. como nueva referencia)")
+    parser.add_argument('--comparar', help="JSON de referencia con el que comparar")
+    parser.add_argument('--tolerancia', type=float, default=0.25, help="empeoramiento admitido (0.25 = 25%%)")
+    args = parser.parse_args(argumentos)
+
+    try:
+        informe = ejecutar(args.ruta, args.repeticiones, args.repeticiones_frio, args.semilla, args.filtro)
+    except FileNotFoundError as e:
+        print(e, file=sys.stderr)
+        return 2
+    imprimir_informe(informe)
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump(informe, archivo, indent=2, ensure_ascii=False)
+        print(f"Informe guardado en {args.guardar}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)
+        if base['meta'].get('pacientes') != informe['meta']['pacientes']:
+            print(f"Aviso: la referencia se midió con {base['meta'].get('pacientes')} pacientes "
+                  f"y esta ejecución con {informe['meta']['pacientes']}")
+        regresiones = comparar(informe, base, args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} regresiones frente a {args.comparar}:")
+            for nombre, modo, p, antes, ahora in regresiones:
+                print(f"  {nombre} ({modo}) {p}: {antes:.3f} -> {ahora:.3f} ms (+{(ahora / antes - 1) * 100:.0f}%)")
+            return 1
+        print(f"\nSin regresiones frente a {args.comparar} (tolerancia {args.tolerancia:.0%})")
+    return 0
+
+
+# Ejemplos:
+#   python generar_datos.py data/bench_100k.db --tamano mediana --referencia 2025-01-01
+#   python benchmark.py data/bench_100k.db --guardar referencia_100k.json
+#   python benchmark.py data/bench_100k.db --comparar referencia_100k.json
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,99 +1,810 @@
-import sqlite3
 import os
-from datetime import datetime
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+from datetime import datetime, date, timedelta
+from imagenes import generar_variantes
+from indice_nombres import IndiceNombres
+from registros import Paciente, ResumenPaciente, FilaPaciente, Cita, Foto, Estadisticas, columnas
+import instrumentacion
+
+
+# --- MIGRACIONES DE ESQUEMA ---
+# Cada migración recibe un cursor y se ejecuta dentro de una transacción.
+# La versión aplicada se guarda en PRAGMA user_version del archivo.
+
+def _migracion_esquema_inicial(cursor):
+    """Tablas base y etiquetas por defecto"""
+    # Tabla de pacientes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pacientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre TEXT NOT NULL,
+            telefono TEXT,
+            email TEXT,
+            fecha_nacimiento TEXT,
+            direccion TEXT,
+            fecha_registro TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabla de citas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS citas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            paciente_id INTEGER,
+            fecha TEXT NOT NULL,
+            notas TEXT,
+            tratamiento TEXT,
+            FOREIGN KEY (paciente_id) REFERENCES pacientes (id)
+        )
+    ''')
+    
+    # Tabla de fotos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fotos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            paciente_id INTEGER,
+            fecha TEXT NOT NULL,
+            ruta_archivo TEXT NOT NULL,
+            descripcion TEXT,
+            FOREIGN KEY (paciente_id) REFERENCES pacientes (id)
+        )
+    ''')
+    
+    # Catálogo de etiquetas disponibles
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS etiquetas_disponibles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nombre_etiqueta TEXT UNIQUE NOT NULL,
+            categoria TEXT DEFAULT 'general'
+        )
+    ''')
+    
+    # Relación pacientes-etiquetas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS etiquetas_pacientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            paciente_id INTEGER,
+            etiqueta_id INTEGER,
+            FOREIGN KEY (paciente_id) REFERENCES pacientes (id),
+            FOREIGN KEY (etiqueta_id) REFERENCES etiquetas_disponibles (id),
+            UNIQUE(paciente_id, etiqueta_id)
+        )
+    ''')
+    
+    # Insertar etiquetas comunes por defecto
+    etiquetas_comunes = [
+        'diabetes', 'uñero', 'hongos', 'callos', 'juanetes',
+        'pie plano', 'espolón', 'circulación', 'anciano', 'deportista',
+        'niño', 'adulto mayor', 'diabético', 'postoperatorio'
+    ]
+    cursor.executemany(
+        'INSERT OR IGNORE INTO etiquetas_disponibles (nombre_etiqueta) VALUES (?)',
+        [(etiqueta,) for etiqueta in etiquetas_comunes]
+    )
+
+
+def _migracion_indices(cursor):
+    """Índices secundarios para citas, fotos y etiquetas"""
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_citas_paciente_fecha ON citas (paciente_id, fecha)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_citas_fecha ON citas (fecha)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fotos_paciente_fecha ON fotos (paciente_id, fecha)')
+    # UNIQUE(paciente_id, etiqueta_id) ya cubre la búsqueda por paciente;
+    # este índice cubre el camino inverso (etiqueta -> pacientes)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_etiquetas_pacientes_etiqueta ON etiquetas_pacientes (etiqueta_id, paciente_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pacientes_nombre ON pacientes (nombre)')
+
+
+def _migracion_busqueda_fts(cursor):
+    """Índice de texto completo para búsqueda de pacientes"""
+    # Tabla FTS5 de contenido externo: el texto vive en pacientes y aquí solo
+    # se guarda el índice. remove_diacritics hace que "perez" encuentre "Pérez"
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS pacientes_fts USING fts5(
+            nombre, telefono, email, direccion,
+            content='pacientes',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    
+    # Triggers para mantener el índice sincronizado con pacientes
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS pacientes_fts_ai AFTER INSERT ON pacientes BEGIN
+            INSERT INTO pacientes_fts (rowid, nombre, telefono, email, direccion)
+            VALUES (new.id, new.nombre, new.telefono, new.email, new.direccion);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS pacientes_fts_ad AFTER DELETE ON pacientes BEGIN
+            INSERT INTO pacientes_fts (pacientes_fts, rowid, nombre, telefono, email, direccion)
+            VALUES ('delete', old.id, old.nombre, old.telefono, old.email, old.direccion);
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS pacientes_fts_au AFTER UPDATE ON pacientes BEGIN
+            INSERT INTO pacientes_fts (pacientes_fts, rowid, nombre, telefono, email, direccion)
+            VALUES ('delete', old.id, old.nombre, old.telefono, old.email, old.direccion);
+            INSERT INTO pacientes_fts (rowid, nombre, telefono, email, direccion)
+            VALUES (new.id, new.nombre, new.telefono, new.email, new.direccion);
+        END
+    ''')
+    
+    # Indexar los pacientes que ya existían
+    cursor.execute("INSERT INTO pacientes_fts (pacientes_fts) VALUES ('rebuild')")
+
+
+def _migracion_variantes_fotos(cursor):
+    """Rutas de miniatura y versión de visor en fotos"""
+    # Las fotos existentes quedan en NULL hasta ejecutar: python imagenes.py
+    cursor.execute('ALTER TABLE fotos ADD COLUMN ruta_miniatura TEXT')
+    cursor.execute('ALTER TABLE fotos ADD COLUMN ruta_visor TEXT')
+
+
+def _migracion_hash_fotos(cursor):
+    """Hash de contenido de cada foto para el almacén sin duplicados"""
+    # Las fotos antiguas quedan en NULL hasta ejecutar: python almacen_fotos.py
+    cursor.execute('ALTER TABLE fotos ADD COLUMN hash TEXT')
+    # Contar referencias a un archivo es una búsqueda en este índice
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_fotos_hash ON fotos (hash)')
+
+
+def _reconstruir_tabla(cursor, tabla, definicion):
+    """Volver a crear una tabla con otra definición conservando filas, índices y triggers
+
+    SQLite no permite cambiar restricciones con ALTER TABLE. La nueva definición
+    debe tener las mismas columnas; las claves foráneas deben estar desactivadas.
+    """
+    objetos = [sql for (sql,) in cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+        (tabla,)
+    ).fetchall()]
+    columnas = ', '.join(fila[1] for fila in cursor.execute(f'PRAGMA table_info({tabla})').fetchall())
+    # Último id de AUTOINCREMENT: los ids de filas ya borradas no deben reutilizarse
+    secuencia = cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = ?', (tabla,)).fetchone()
+    cursor.execute(f'CREATE TABLE {tabla}_nueva ({definicion})')
+    cursor.execute(f'INSERT INTO {tabla}_nueva ({columnas}) SELECT {columnas} FROM {tabla}')
+    cursor.execute(f'DROP TABLE {tabla}')
+    cursor.execute(f'ALTER TABLE {tabla}_nueva RENAME TO {tabla}')
+    if secuencia:
+        cursor.execute('DELETE FROM sqlite_sequence WHERE name = ?', (tabla,))
+        cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (tabla, secuencia[0]))
+    for sql in objetos:
+        cursor.execute(sql)
+
+
+def _migracion_borrado_en_cascada(cursor):
+    """Claves foráneas con ON DELETE CASCADE y cola de archivos por borrar"""
+    # Archivos de fotos pendientes de borrar del disco. Se anotan en la misma
+    # transacción que borra las filas, así que sobreviven a un cierre o caída
+    cursor.execute('''
+        CREATE TABLE archivos_por_borrar (
+            ruta TEXT PRIMARY KEY,
+            hash TEXT
+        )
+    ''')
+    
+    # Filas cuyo paciente ya no existe: con las claves activas no se podrían tocar
+    for columna in ('ruta_archivo', 'ruta_miniatura', 'ruta_visor'):
+        cursor.execute(f'''
+            INSERT OR IGNORE INTO archivos_por_borrar (ruta, hash)
+            SELECT {columna}, hash FROM fotos
+            WHERE {columna} IS NOT NULL AND paciente_id NOT IN (SELECT id FROM pacientes)
+        ''')
+    for tabla in ('etiquetas_pacientes', 'fotos', 'citas'):
+        cursor.execute(f'DELETE FROM {tabla} WHERE paciente_id NOT IN (SELECT id FROM pacientes)')
+        if cursor.rowcount:
+            print(f"Aviso: {cursor.rowcount} filas de {tabla} sin paciente eliminadas")
+    cursor.execute('''
+        DELETE FROM etiquetas_pacientes
+        WHERE etiqueta_id NOT IN (SELECT id FROM etiquetas_disponibles)
+    ''')
+    
+    _reconstruir_tabla(cursor, 'citas', '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        paciente_id INTEGER,
+        fecha TEXT NOT NULL,
+        notas TEXT,
+        tratamiento TEXT,
+        fecha_hora TEXT,
+        FOREIGN KEY (paciente_id) REFERENCES pacientes (id) ON DELETE CASCADE
+    ''')
+    _reconstruir_tabla(cursor, 'fotos', '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        paciente_id INTEGER,
+        fecha TEXT NOT NULL,
+        ruta_archivo TEXT NOT NULL,
+        descripcion TEXT,
+        ruta_miniatura TEXT,
+        ruta_visor TEXT,
+        hash TEXT,
+        FOREIGN KEY (paciente_id) REFERENCES pacientes (id) ON DELETE CASCADE
+    ''')
+    _reconstruir_tabla(cursor, 'etiquetas_pacientes', '''
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        paciente_id INTEGER,
+        etiqueta_id INTEGER,
+        FOREIGN KEY (paciente_id) REFERENCES pacientes (id) ON DELETE CASCADE,
+        FOREIGN KEY (etiqueta_id) REFERENCES etiquetas_disponibles (id) ON DELETE CASCADE,
+        UNIQUE(paciente_id, etiqueta_id)
+    ''')
+    
+    # Borrar miles de pacientes dispara los triggers de baja por cada cita: se
+    # vuelven a crear con la condición que va por clave primaria
+    for trigger in ('estadisticas_cita_baja', 'estadisticas_cita_cambio_antes', 'estadisticas_paciente_eliminado'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    _crear_triggers_descuento(cursor)
+
+
+def _migracion_fecha_hora_citas(cursor):
+    """Fecha normalizada e indexada en citas"""
+    # fecha se conserva tal como se escribió; fecha_hora es la versión ISO-8601
+    # ordenable sobre la que se hacen todas las consultas por rango
+    cursor.execute('ALTER TABLE citas ADD COLUMN fecha_hora TEXT')
+    
+    lectura = cursor.connection.cursor()
+    lectura.execute('SELECT id, fecha FROM citas')
+    sin_convertir = 0
+    while True:
+        filas = lectura.fetchmany(10000)
+        if not filas:
+            break
+        cambios = []
+        for cita_id, fecha in filas:
+            try:
+                cambios.append((normalizar_fecha(fecha), cita_id))
+            except ValueError:
+                sin_convertir += 1
+        cursor.executemany('UPDATE citas SET fecha_hora = ? WHERE id = ?', cambios)
+    if sin_convertir:
+        print(f"Aviso: {sin_convertir} citas con fecha no reconocida quedan sin fecha_hora")
+    
+    # Los índices sobre el texto libre dejan de usarse
+    cursor.execute('DROP INDEX IF EXISTS idx_citas_paciente_fecha')
+    cursor.execute('DROP INDEX IF EXISTS idx_citas_fecha')
+    cursor.execute('CREATE INDEX idx_citas_paciente_fecha_hora ON citas (paciente_id, fecha_hora)')
+    cursor.execute('CREATE INDEX idx_citas_fecha_hora ON citas (fecha_hora)')
+
+
+# --- ESTADÍSTICAS ACUMULADAS ---
+# Tablas de resumen por día, semana (clave = lunes) y mes que mantienen los
+# triggers de citas y pacientes, para que las estadísticas no recorran el historial.
+
+def _periodos(fecha, total=False):
+    """SELECT con las claves (tipo, periodo) de una fecha para cada agregación"""
+    sql = (
+        f"SELECT 'dia' AS tipo, date({fecha}) AS periodo "
+        f"UNION ALL SELECT 'semana', date({fecha}, '-6 days', 'weekday 1') "
+        f"UNION ALL SELECT 'mes', strftime('%Y-%m', {fecha})"
+    )
+    if total:
+        sql += " UNION ALL SELECT 'total', 'total'"
+    return sql
+
+
+def _sql_sumar_cita(ref):
+    """Sentencias que suman la cita ref (NEW u OLD) a los resúmenes"""
+    periodos = _periodos(f'{ref}.fecha_hora')
+    return f'''
+        INSERT INTO estadisticas_periodo (tipo, periodo, citas)
+        SELECT tipo, periodo, 1 FROM ({periodos}) WHERE true
+        ON CONFLICT (tipo, periodo) DO UPDATE SET citas = citas + 1;
+        INSERT INTO estadisticas_paciente_periodo (tipo, periodo, paciente_id, citas)
+        SELECT tipo, periodo, {ref}.paciente_id, 1 FROM ({periodos}) WHERE true
+        ON CONFLICT (tipo, periodo, paciente_id) DO UPDATE SET citas = citas + 1;
+        INSERT INTO estadisticas_tratamiento (tipo, periodo, tratamiento, citas)
+        SELECT tipo, periodo, COALESCE({ref}.tratamiento, ''), 1 FROM ({periodos}) WHERE true
+        ON CONFLICT (tipo, periodo, tratamiento) DO UPDATE SET citas = citas + 1;
+    '''
+
+
+def _condicion_periodos(fecha, total=False):
+    """Condición WHERE con las claves (tipo, periodo) de una fecha
+    
+    Con OR de igualdades SQLite busca cada clave por la clave primaria; con
+    (tipo, periodo) IN (...) recorría la tabla entera en cada fila del trigger.
+    """
+    condiciones = [
+        f"(tipo = 'dia' AND periodo = date({fecha}))",
+        f"(tipo = 'semana' AND periodo = date({fecha}, '-6 days', 'weekday 1'))",
+        f"(tipo = 'mes' AND periodo = strftime('%Y-%m', {fecha}))",
+    ]
+    if total:
+        condiciones.append("(tipo = 'total' AND periodo = 'total')")
+    return f"({' OR '.join(condiciones)})"
+
+
+def _sql_restar_cita(ref):
+    """Sentencias que descuentan la cita ref (NEW u OLD) de los resúmenes"""
+    periodos = _condicion_periodos(f'{ref}.fecha_hora')
+    return f'''
+        UPDATE estadisticas_periodo SET citas = citas - 1
+        WHERE {periodos};
+        UPDATE estadisticas_paciente_periodo SET citas = citas - 1
+        WHERE paciente_id = {ref}.paciente_id AND {periodos};
+        DELETE FROM estadisticas_paciente_periodo
+        WHERE paciente_id = {ref}.paciente_id AND citas <= 0;
+        UPDATE estadisticas_tratamiento SET citas = citas - 1
+        WHERE tratamiento = COALESCE({ref}.tratamiento, '') AND {periodos};
+        DELETE FROM estadisticas_tratamiento
+        WHERE tratamiento = COALESCE({ref}.tratamiento, '') AND citas <= 0 AND {periodos};
+        DELETE FROM estadisticas_periodo
+        WHERE citas <= 0 AND pacientes_nuevos <= 0 AND {periodos};
+    '''
+
+
+def _crear_triggers_descuento(cursor):
+    """Triggers que descuentan de los resúmenes las citas y los pacientes que se van"""
+    cursor.execute(f'''
+        CREATE TRIGGER estadisticas_cita_baja AFTER DELETE ON citas
+        WHEN OLD.fecha_hora IS NOT NULL BEGIN
+            {_sql_restar_cita('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER estadisticas_cita_cambio_antes AFTER UPDATE OF fecha_hora, paciente_id, tratamiento ON citas
+        WHEN OLD.fecha_hora IS NOT NULL BEGIN
+            {_sql_restar_cita('OLD')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER estadisticas_paciente_eliminado AFTER DELETE ON pacientes BEGIN
+            UPDATE estadisticas_periodo SET pacientes_nuevos = pacientes_nuevos - 1
+            WHERE {_condicion_periodos('OLD.fecha_registro', total=True)};
+        END
+    ''')
+
+
+def _reconstruir_estadisticas(cursor):
+    """Recalcular desde cero todas las tablas de resumen"""
+    cursor.execute('DELETE FROM estadisticas_paciente_periodo')
+    cursor.execute('DELETE FROM estadisticas_tratamiento')
+    cursor.execute('DELETE FROM estadisticas_periodo')
+    
+    expresiones = {
+        'dia': "date({f})",
+        'semana': "date({f}, '-6 days', 'weekday 1')",
+        'mes': "strftime('%Y-%m', {f})",
+    }
+    for tipo, expresion in expresiones.items():
+        periodo_cita = expresion.format(f='fecha_hora')
+        periodo_registro = expresion.format(f='fecha_registro')
+        cursor.execute(f'''
+            INSERT INTO estadisticas_periodo (tipo, periodo, citas)
+            SELECT ?, {periodo_cita}, COUNT(*) FROM citas
+            WHERE fecha_hora IS NOT NULL GROUP BY 2
+        ''', (tipo,))
+        # El trigger de estadisticas_paciente_periodo va sumando pacientes_distintos
+        cursor.execute(f'''
+            INSERT INTO estadisticas_paciente_periodo (tipo, periodo, paciente_id, citas)
+            SELECT ?, {periodo_cita}, paciente_id, COUNT(*) FROM citas
+            WHERE fecha_hora IS NOT NULL GROUP BY 2, 3
+        ''', (tipo,))
+        cursor.execute(f'''
+            INSERT INTO estadisticas_tratamiento (tipo, periodo, tratamiento, citas)
+            SELECT ?, {periodo_cita}, COALESCE(tratamiento, ''), COUNT(*) FROM citas
+            WHERE fecha_hora IS NOT NULL GROUP BY 2, 3
+        ''', (tipo,))
+        cursor.execute(f'''
+            INSERT INTO estadisticas_periodo (tipo, periodo, pacientes_nuevos)
+            SELECT ?, {periodo_registro}, COUNT(*) FROM pacientes GROUP BY 2 HAVING true
+            ON CONFLICT (tipo, periodo) DO UPDATE SET pacientes_nuevos = excluded.pacientes_nuevos
+        ''', (tipo,))
+    cursor.execute('''
+        INSERT INTO estadisticas_periodo (tipo, periodo, pacientes_nuevos)
+        SELECT 'total', 'total', COUNT(*) FROM pacientes
+    ''')
+
+
+def _migracion_estadisticas(cursor):
+    """Tablas de resumen de citas y pacientes mantenidas por triggers"""
+    cursor.execute('''
+        CREATE TABLE estadisticas_periodo (
+            tipo TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            citas INTEGER NOT NULL DEFAULT 0,
+            pacientes_distintos INTEGER NOT NULL DEFAULT 0,
+            pacientes_nuevos INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tipo, periodo)
+        ) WITHOUT ROWID
+    ''')
+    # Citas de cada paciente por periodo: permite contar pacientes distintos
+    # sumando o restando solo cuando un paciente aparece o desaparece del periodo
+    cursor.execute('''
+        CREATE TABLE estadisticas_paciente_periodo (
+            tipo TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            paciente_id INTEGER NOT NULL,
+            citas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tipo, periodo, paciente_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE estadisticas_tratamiento (
+            tipo TEXT NOT NULL,
+            periodo TEXT NOT NULL,
+            tratamiento TEXT NOT NULL,
+            citas INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tipo, periodo, tratamiento)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX idx_estadisticas_paciente ON estadisticas_paciente_periodo (paciente_id)')
+    
+    # Pacientes distintos
+    cursor.execute('''
+        CREATE TRIGGER estadisticas_paciente_alta AFTER INSERT ON estadisticas_paciente_periodo BEGIN
+            UPDATE estadisticas_periodo SET pacientes_distintos = pacientes_distintos + 1
+            WHERE tipo = NEW.tipo AND periodo = NEW.periodo;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER estadisticas_paciente_baja AFTER DELETE ON estadisticas_paciente_periodo BEGIN
+            UPDATE estadisticas_periodo SET pacientes_distintos = pacientes_distintos - 1
+            WHERE tipo = OLD.tipo AND periodo = OLD.periodo;
+        END
+    ''')
+    
+    # Citas
+    cursor.execute(f'''
+        CREATE TRIGGER estadisticas_cita_alta AFTER INSERT ON citas
+        WHEN NEW.fecha_hora IS NOT NULL BEGIN
+            {_sql_sumar_cita('NEW')}
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER estadisticas_cita_cambio_despues AFTER UPDATE OF fecha_hora, paciente_id, tratamiento ON citas
+        WHEN NEW.fecha_hora IS NOT NULL BEGIN
+            {_sql_sumar_cita('NEW')}
+        END
+    ''')
+    
+    # Altas de pacientes
+    cursor.execute(f'''
+        CREATE TRIGGER estadisticas_paciente_registro AFTER INSERT ON pacientes BEGIN
+            INSERT INTO estadisticas_periodo (tipo, periodo, pacientes_nuevos)
+            SELECT tipo, periodo, 1 FROM ({_periodos('NEW.fecha_registro', total=True)}) WHERE true
+            ON CONFLICT (tipo, periodo) DO UPDATE SET pacientes_nuevos = pacientes_nuevos + 1;
+        END
+    ''')
+    
+    # Bajas de citas y pacientes
+    _crear_triggers_descuento(cursor)
+    
+    _reconstruir_estadisticas(cursor)
+
+
+def _migracion_version_pacientes(cursor):
+    """Contador de cambios en pacientes para el índice de nombres"""
+    # El índice en memoria se reconstruye cuando otra conexión cambia pacientes.
+    # PRAGMA data_version no sirve: también cambia con escrituras en otras tablas
+    # (p. ej. archivos_por_borrar desde el hilo que borra archivos)
+    cursor.execute('CREATE TABLE version_pacientes (version INTEGER NOT NULL)')
+    cursor.execute('INSERT INTO version_pacientes (version) VALUES (0)')
+    # Una unidad por fila afectada, así una conexión sabe cuánto sumaron sus escrituras
+    for nombre, evento in (('alta', 'INSERT'), ('baja', 'DELETE'), ('nombre', 'UPDATE OF nombre')):
+        cursor.execute(f'''
+            CREATE TRIGGER version_pacientes_{nombre} AFTER {evento} ON pacientes BEGIN
+                UPDATE version_pacientes SET version = version + 1;
+            END
+        ''')
+
+
+def _migracion_orden_citas(cursor):
+    """Índice del orden por páginas de las citas de un paciente"""
+    # Las citas se paginan por (COALESCE(fecha_hora, ''), id) para no perder las
+    # que quedaron sin fecha_hora; con este índice cada página es un rango sin ordenar
+    cursor.execute('''
+        CREATE INDEX idx_citas_paciente_orden ON citas (paciente_id, COALESCE(fecha_hora, ''), id)
+    ''')
+
+
+MIGRACIONES = [
+    (1, _migracion_esquema_inicial),
+    (2, _migracion_indices),
+    (3, _migracion_busqueda_fts),
+    (4, _migracion_variantes_fotos),
+    (5, _migracion_fecha_hora_citas),
+    (6, _migracion_estadisticas),
+    (7, _migracion_hash_fotos),
+    (8, _migracion_borrado_en_cascada),
+    (9, _migracion_version_pacientes),
+    (10, _migracion_orden_citas),
+]
+
+VERSION_ESQUEMA = MIGRACIONES[-1][0]
+
+
+# --- FECHAS ---
+# Formatos aceptados al escribir una cita; se guardan siempre como FORMATO_FECHA_HORA
+FORMATO_FECHA_HORA = "%Y-%m-%d %H:%M:%S"
+FORMATOS_FECHA = [
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%dT%H:%M", "%Y-%m-%d",
+    "%d/%m/%Y %H:%M", "%d/%m/%Y", "%d-%m-%Y %H:%M", "%d-%m-%Y",
+]
+
+
+def normalizar_fecha(valor):
+    """Convertir texto, date o datetime a 'YYYY-MM-DD HH:MM:SS' (ValueError si no es válida)"""
+    if isinstance(valor, datetime):
+        return valor.strftime(FORMATO_FECHA_HORA)
+    if isinstance(valor, date):
+        return valor.strftime("%Y-%m-%d 00:00:00")
+    
+    texto = str(valor or '').strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).strftime(FORMATO_FECHA_HORA)
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha no válida: '{texto}' (usa AAAA-MM-DD HH:MM)")
+
+
+# --- CONFIGURACIÓN DE LA CONEXIÓN ---
+# Ruta y perfil se pueden cambiar con PODOLOGIA_DB / PODOLOGIA_PERFIL o al crear Database
+RUTA_DB = os.environ.get('PODOLOGIA_DB', 'data/podologia.db')
+PERFIL_POR_DEFECTO = os.environ.get('PODOLOGIA_PERFIL', 'rendimiento')
+
+# Filas que se leen de cada vez al recorrer una consulta (recorrer_*)
+TAMANO_BLOQUE = 500
+
+PERFILES_SQLITE = {
+    # WAL: los lectores (asistente) no se bloquean con las escrituras de la interfaz.
+    # synchronous=NORMAL en WAL solo arriesga la última transacción ante un corte de luz
+    'rendimiento': {
+        'journal_mode': 'wal',
+        'synchronous': 1,             # NORMAL
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,         # ~64 MB (negativo = KiB)
+        'temp_store': 2,              # MEMORY
+        'busy_timeout': 5000,
+    },
+    # Igual pero con fsync en cada commit
+    'seguro': {
+        'journal_mode': 'wal',
+        'synchronous': 2,             # FULL
+        'cache_size': -16000,
+        'temp_store': 2,
+        'busy_timeout': 5000,
+    },
+    # Valores por defecto de SQLite (diario rollback), por si la carpeta está en red
+    'compatible': {
+        'journal_mode': 'delete',
+        'synchronous': 2,
+        'busy_timeout': 5000,
+    },
+}
+
+
+def configurar_conexion(conn, perfil=PERFIL_POR_DEFECTO):
+    """Aplicar un perfil de PERFILES_SQLITE y devolver {pragma: (esperado, actual)}"""
+    if perfil not in PERFILES_SQLITE:
+        raise ValueError(f"Perfil SQLite desconocido: {perfil}")
+    
+    resultado = {}
+    for pragma, valor in PERFILES_SQLITE[perfil].items():
+        conn.execute(f'PRAGMA {pragma} = {valor}')
+        actual = conn.execute(f'PRAGMA {pragma}').fetchone()
+        resultado[pragma] = (valor, actual[0] if actual else None)
+    return resultado
+
 
 class Database:
-    def __init__(self):
+    def __init__(self, ruta_db=RUTA_DB, perfil=PERFIL_POR_DEFECTO, tamano_cache=1024):
         self.conn = None
         self.cursor = None
+        self.ruta_db = ruta_db
+        self.perfil = perfil
+        # Caché LRU de fichas de paciente por id (se invalida en cada escritura)
+        self.cache_pacientes = OrderedDict()
+        self.tamano_cache = tamano_cache
+        # Profundidad de bloques transaccion() abiertos (0 = cada operación confirma)
+        self.nivel_transaccion = 0
+        # Hay archivos anotados en archivos_por_borrar desde el último commit.
+        # Se borran al confirmar, aquí mismo o en el hilo de borrador_archivos si se asigna
+        self.hay_archivos_por_borrar = False
+        self.borrador_archivos = None
+        # Índice de nombres tolerante a erratas: se construye en la primera búsqueda
+        # y se mantiene con cada alta, edición o baja de esta conexión
+        self.indice_nombres = None
+        self.version_pacientes = None
         self.init_db()
     
     def init_db(self):
-        """Inicializar la base de datos y tablas"""
+        """Inicializar la base de datos y aplicar migraciones pendientes"""
         # Crear carpeta data si no existe
         if not os.path.exists('data'):
             os.makedirs('data')
             os.makedirs('data/fotos')
+        carpeta_db = os.path.dirname(self.ruta_db)
+        if carpeta_db:
+            os.makedirs(carpeta_db, exist_ok=True)
         
-        self.conn = sqlite3.connect('data/podologia.db')
+        self.conn = instrumentacion.conectar(self.ruta_db, 'database')
         self.cursor = self.conn.cursor()
+        self.verificar_perfil(configurar_conexion(self.conn, self.perfil))
         
-        # Tabla de pacientes
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pacientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre TEXT NOT NULL,
-                telefono TEXT,
-                email TEXT,
-                fecha_nacimiento TEXT,
-                direccion TEXT,
-                fecha_registro TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        version = self.cursor.execute('PRAGMA user_version').fetchone()[0]
+        if version < VERSION_ESQUEMA:
+            self.aplicar_migraciones(version)
+        # Después de migrar: reconstruir tablas exige tener las claves desactivadas
+        self.cursor.execute('PRAGMA foreign_keys = ON')
         
-        # Tabla de citas
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS citas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                paciente_id INTEGER,
-                fecha TEXT NOT NULL,
-                notas TEXT,
-                tratamiento TEXT,
-                FOREIGN KEY (paciente_id) REFERENCES pacientes (id)
-            )
-        ''')
+        print("Base de datos inicializada correctamente")
+    
+    def verificar_perfil(self, resultado):
+        """Informar del perfil aplicado y avisar de los PRAGMA que SQLite no aceptó"""
+        # p. ej. mmap_size puede quedar en 0 si la plataforma no lo soporta
+        distintos = [
+            f"{pragma}={actual} (esperado {esperado})"
+            for pragma, (esperado, actual) in resultado.items()
+            if str(actual).lower() != str(esperado).lower()
+        ]
+        if distintos:
+            print(f"Aviso: perfil '{self.perfil}' aplicado parcialmente: {', '.join(distintos)}")
+        else:
+            print(f"Perfil SQLite '{self.perfil}' aplicado en {self.ruta_db}")
+        return not distintos
+    
+    def aplicar_migraciones(self, version_actual):
+        """Aplicar en orden las migraciones posteriores a version_actual"""
+        for version, migracion in MIGRACIONES:
+            if version <= version_actual:
+                continue
+            try:
+                # Cada migración va en su propia transacción junto con user_version
+                self.cursor.execute('BEGIN')
+                migracion(self.cursor)
+                self.cursor.execute(f'PRAGMA user_version = {version}')
+                self.conn.commit()
+                print(f"Migración {version} aplicada: {migracion.__doc__}")
+            except Exception as e:
+                self.conn.rollback()
+                print(f"Error aplicando migración {version}: {e}")
+                raise
+    
+    # --- TRANSACCIONES ---
+    @contextmanager
+    def transaccion(self):
+        """Agrupar varias operaciones en una sola transacción (un único commit)
         
-        # Tabla de fotos
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS fotos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                paciente_id INTEGER,
-                fecha TEXT NOT NULL,
-                ruta_archivo TEXT NOT NULL,
-                descripcion TEXT,
-                FOREIGN KEY (paciente_id) REFERENCES pacientes (id)
-            )
-        ''')
+        Dentro del bloque las operaciones no confirman; al salir se hace commit,
+        o rollback si hubo una excepción. Los bloques se pueden anidar.
+        """
+        if self.nivel_transaccion == 0 and not self.conn.in_transaction:
+            self.cursor.execute('BEGIN')
+        self.nivel_transaccion += 1
+        try:
+            yield self
+        except Exception:
+            self.nivel_transaccion -= 1
+            if self.nivel_transaccion == 0:
+                self.conn.rollback()
+                self.hay_archivos_por_borrar = False
+                # El índice pudo recibir cambios que ya no existen: se reconstruirá
+                self.indice_nombres = None
+            raise
+        else:
+            self.nivel_transaccion -= 1
+            if self.nivel_transaccion == 0:
+                self.conn.commit()
+                self._avisar_borrado()
+    
+    def _commit(self):
+        """Confirmar salvo que estemos dentro de un bloque transaccion()"""
+        if self.nivel_transaccion == 0:
+            self.conn.commit()
+            self._avisar_borrado()
+    
+    def _avisar_borrado(self):
+        """Tras confirmar, borrar lo anotado en archivos_por_borrar (o avisar al hilo que lo hace)"""
+        if self.hay_archivos_por_borrar:
+            self.hay_archivos_por_borrar = False
+            if self.borrador_archivos:
+                self.borrador_archivos.avisar()
+            else:
+                self.borrar_archivos_pendientes()
+    
+    def borrar_archivos_pendientes(self, limite=500):
+        """Borrar del disco hasta limite archivos anotados; devuelve cuántos se resolvieron
         
-        # NUEVO: Catálogo de etiquetas disponibles
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS etiquetas_disponibles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre_etiqueta TEXT UNIQUE NOT NULL,
-                categoria TEXT DEFAULT 'general'
-            )
-        ''')
+        Las filas se quitan de la cola antes de mirar nada: así esta conexión tiene
+        el bloqueo de escritura y ninguna foto nueva puede empezar a usar el archivo
+        mientras se borra. Un archivo que se volvió a usar se deja; uno que no se
+        pudo borrar vuelve a la cola para el siguiente intento.
+        """
+        self.cursor.execute('SELECT ruta, hash FROM archivos_por_borrar LIMIT ?', (limite,))
+        pendientes = self.cursor.fetchall()
+        if not pendientes:
+            return 0
         
-        # NUEVO: Relación pacientes-etiquetas
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS etiquetas_pacientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                paciente_id INTEGER,
-                etiqueta_id INTEGER,
-                FOREIGN KEY (paciente_id) REFERENCES pacientes (id),
-                FOREIGN KEY (etiqueta_id) REFERENCES etiquetas_disponibles (id),
-                UNIQUE(paciente_id, etiqueta_id)
-            )
-        ''')
+        fallidos = []
+        with self.transaccion():
+            self.cursor.executemany('DELETE FROM archivos_por_borrar WHERE ruta = ?',
+                                    [(ruta,) for ruta, _ in pendientes])
+            for ruta, hash_archivo in pendientes:
+                # Las fotos antiguas (sin hash) eran archivos propios de una sola fila
+                if hash_archivo is not None and self.contar_referencias_foto(hash_archivo, ruta):
+                    continue
+                try:
+                    if os.path.exists(ruta):
+                        os.remove(ruta)
+                except OSError as e:
+                    print(f"No se pudo borrar {ruta}: {e}")
+                    fallidos.append((ruta, hash_archivo))
+            self.cursor.executemany('INSERT INTO archivos_por_borrar (ruta, hash) VALUES (?, ?)', fallidos)
+        return len(pendientes) - len(fallidos)
+    
+    def _recuperar_archivos(self, fotos):
+        """Sacar de la cola de borrado los archivos que una foto nueva vuelve a usar
         
-        # Insertar etiquetas comunes por defecto
-        etiquetas_comunes = [
-            'diabetes', 'uñero', 'hongos', 'callos', 'juanetes',
-            'pie plano', 'espolón', 'circulación', 'anciano', 'deportista',
-            'niño', 'adulto mayor', 'diabético', 'postoperatorio'
-        ]
+        fotos: (ruta_archivo, ruta_miniatura, ruta_visor). Se llama dentro de la
+        transacción que inserta las fotos; si el archivo ya se borró, FileNotFoundError
+        (hay que volver a subir la foto).
+        """
+        self.cursor.executemany('DELETE FROM archivos_por_borrar WHERE ruta = ?',
+                                [(ruta,) for rutas in fotos for ruta in rutas if ruta])
+        for ruta_archivo, _, _ in fotos:
+            if not os.path.exists(ruta_archivo):
+                raise FileNotFoundError(f"El archivo {ruta_archivo} se borró mientras se subía la foto")
+    
+    # --- LECTURAS POR BLOQUES Y POR PÁGINAS ---
+    # Las listas largas se pueden leer de dos formas: recorrer_* genera las filas
+    # sin cargarlas todas (se puede parar en cualquier momento) y obtener_* con
+    # despues/limite devuelve una página a partir de la clave de la última fila
+    # de la anterior (sin OFFSET, así cada página cuesta lo mismo).
+    
+    def _recorrer(self, registro, sql, parametros=(), tamano_bloque=TAMANO_BLOQUE):
+        """Generar las filas de una consulta como registro, leyendo de tamano_bloque en tamano_bloque
         
-        for etiqueta in etiquetas_comunes:
-            try:
-                self.cursor.execute(
-                    'INSERT OR IGNORE INTO etiquetas_disponibles (nombre_etiqueta) VALUES (?)',
-                    (etiqueta,)
-                )
-            except:
-                pass
+        Usa un cursor propio, así que mientras se recorre se pueden hacer otras
+        operaciones; al terminar o dejar de iterar, el cursor se cierra.
+        """
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(sql, parametros)
+            while True:
+                filas = cursor.fetchmany(tamano_bloque)
+                if not filas:
+                    return
+                yield from map(registro._make, filas)
+        finally:
+            cursor.close()
+    
+    def _leer(self, registro, sql, parametros=()):
+        """Ejecutar una consulta y devolver todas sus filas como registro"""
+        self.cursor.execute(sql, parametros)
+        return list(map(registro._make, self.cursor.fetchall()))
+    
+    @staticmethod
+    def _ordenar(sql, parametros, clave, despues=None, limite=None, descendente=False):
+        """Añadir a sql (que ya termina en un WHERE) el keyset, el ORDER BY y el LIMIT
         
-        self.conn.commit()
-        print("Base de datos inicializada correctamente")
+        clave: expresiones del orden (('nombre', 'id')); despues: sus valores en la
+        última fila de la página anterior. Devuelve (sql, parametros).
+        
+        Una columna que admite NULL debe ir como COALESCE(columna, ''): con NULL la
+        comparación del keyset no es cierta y esas filas no saldrían en ninguna
+        página. En despues su None se toma como ''.
+        """
+        parametros = list(parametros)
+        orden = 'DESC' if descendente else 'ASC'
+        if despues:
+            despues = ['' if valor is None else valor for valor in despues]
+            comparacion = '<' if descendente else '>'
+            # La cota de la primera expresión por separado: SQLite no acota un índice
+            # de expresiones con la comparación de filas, solo con esta
+            sql += f" AND {clave[0]} {comparacion}= ?"
+            sql += f" AND ({', '.join(clave)}) {comparacion} ({', '.join('?' * len(despues))})"
+            parametros.append(despues[0])
+            parametros.extend(despues)
+        sql += ' ORDER BY ' + ', '.join(f'{expresion} {orden}' for expresion in clave)
+        if limite is not None:
+            sql += ' LIMIT ?'
+            parametros.append(limite)
+        return sql, parametros
     
     # --- OPERACIONES PARA PACIENTES ---
     def agregar_paciente(self, nombre, telefono="", email="", fecha_nacimiento="", direccion=""):
@@ -103,65 +814,295 @@ class Database:
             VALUES (?, ?, ?, ?, ?)
         '''
         self.cursor.execute(query, (nombre, telefono, email, fecha_nacimiento, direccion))
-        self.conn.commit()
-        return self.cursor.lastrowid
+        self._commit()
+        paciente_id = self.cursor.lastrowid
+        self._invalidar_paciente(paciente_id)
+        if self.indice_nombres is not None:
+            self.indice_nombres.agregar(paciente_id, nombre)
+            self._contar_en_indice(1)
+        return paciente_id
     
-    def obtener_pacientes(self):
-        """Obtener todos los pacientes"""
-        self.cursor.execute('SELECT * FROM pacientes ORDER BY nombre')
-        return self.cursor.fetchall()
+    def obtener_paciente(self, paciente_id):
+        """Obtener un paciente por id (None si no existe)"""
+        paciente = self.cache_pacientes.get(paciente_id)
+        if paciente is not None:
+            self.cache_pacientes.move_to_end(paciente_id)
+            return paciente
+        
+        self.cursor.execute(f'SELECT {columnas(Paciente)} FROM pacientes WHERE id = ?', (paciente_id,))
+        paciente = self.cursor.fetchone()
+        if paciente is not None:
+            paciente = Paciente._make(paciente)
+            self.cache_pacientes[paciente_id] = paciente
+            if len(self.cache_pacientes) > self.tamano_cache:
+                self.cache_pacientes.popitem(last=False)
+        return paciente
     
-    def buscar_paciente(self, nombre):
-        """Buscar paciente por nombre"""
-        self.cursor.execute('SELECT * FROM pacientes WHERE nombre LIKE ?', (f'%{nombre}%',))
-        return self.cursor.fetchall()
+    def _invalidar_paciente(self, paciente_id):
+        """Quitar un paciente de la caché tras modificarlo"""
+        self.cache_pacientes.pop(paciente_id, None)
+    
+    def obtener_pacientes(self, despues=None, limite=None):
+        """Obtener los pacientes en orden (nombre, id); una página si se indica limite
+        
+        despues: (nombre, id) del último paciente de la página anterior.
+        """
+        return self._leer(ResumenPaciente, *self._sql_pacientes(despues, limite))
+    
+    def recorrer_pacientes(self):
+        """Generar todos los pacientes en orden (nombre, id) sin cargarlos a la vez"""
+        return self._recorrer(ResumenPaciente, *self._sql_pacientes())
+    
+    def _sql_pacientes(self, despues=None, limite=None):
+        return self._ordenar(f'SELECT {columnas(ResumenPaciente)} FROM pacientes WHERE true', (),
+                             ('nombre', 'id'), despues, limite)
+    
+    def contar_pacientes(self, texto=None):
+        """Contar pacientes (solo los que coinciden con texto si se indica)"""
+        consulta = self._consulta_fts(texto) if texto else ''
+        if consulta:
+            self.cursor.execute('SELECT COUNT(*) FROM pacientes_fts WHERE pacientes_fts MATCH ?', (consulta,))
+        else:
+            self.cursor.execute('SELECT COUNT(*) FROM pacientes')
+        return self.cursor.fetchone()[0]
+    
+    def obtener_pacientes_pagina(self, texto=None, despues=None, antes=None, desplazamiento=0, limite=100):
+        """Obtener una página de FilaPaciente (id, nombre) en orden de (nombre, id)
+        
+        despues/antes son claves (nombre, id) para paginar sin OFFSET; desplazamiento
+        solo se usa para saltos directos. Las filas siempre vuelven en orden ascendente.
+        """
+        condiciones = []
+        parametros = []
+        
+        consulta = self._consulta_fts(texto) if texto else ''
+        if consulta:
+            condiciones.append('id IN (SELECT rowid FROM pacientes_fts WHERE pacientes_fts MATCH ?)')
+            parametros.append(consulta)
+        if despues:
+            condiciones.append('(nombre, id) > (?, ?)')
+            parametros.extend(despues)
+        if antes:
+            condiciones.append('(nombre, id) < (?, ?)')
+            parametros.extend(antes)
+        
+        where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+        orden = 'DESC' if antes else 'ASC'
+        filas = self._leer(FilaPaciente, f'''
+            SELECT {columnas(FilaPaciente)} FROM pacientes
+            {where}
+            ORDER BY nombre {orden}, id {orden}
+            LIMIT ? OFFSET ?
+        ''', (*parametros, limite, desplazamiento))
+        if antes:
+            filas.reverse()
+        return filas
+    
+    def buscar_paciente(self, texto, limite=50):
+        """Buscar pacientes por nombre, teléfono, email o dirección (por prefijo, sin acentos)"""
+        consulta = self._consulta_fts(texto)
+        if not consulta:
+            return []
+        return self._leer(ResumenPaciente, f'''
+            SELECT {columnas(ResumenPaciente, 'p')} FROM pacientes_fts f
+            JOIN pacientes p ON p.id = f.rowid
+            WHERE pacientes_fts MATCH ?
+            ORDER BY f.rank
+            LIMIT ?
+        ''', (consulta, limite))
+    
+    def buscar_por_nombre(self, texto, limite=100):
+        """Buscar pacientes por nombre tolerando erratas y grafías (Giménez/Jiménez)
+        
+        Devuelve [FilaPaciente] ordenados de más a menos parecido. Usa un índice
+        en memoria, así que no consulta la base de datos salvo para construirlo.
+        """
+        return list(map(FilaPaciente._make, self._indice_al_dia().buscar(texto, limite)))
+    
+    def _indice_al_dia(self):
+        """Índice de nombres al día; se reconstruye si otra conexión cambió pacientes"""
+        version = self.cursor.execute('SELECT version FROM version_pacientes').fetchone()[0]
+        if self.indice_nombres is None or version != self.version_pacientes:
+            self.indice_nombres = IndiceNombres().construir(
+                self.conn.execute('SELECT id, nombre FROM pacientes')
+            )
+            self.version_pacientes = version
+        return self.indice_nombres
+    
+    def _contar_en_indice(self, filas):
+        """Sumar a la versión del índice las filas de pacientes que esta conexión ya le aplicó"""
+        # Si además cambió otra conexión, la versión no cuadrará y se reconstruye
+        if self.indice_nombres is not None:
+            self.version_pacientes += filas
+    
+    @staticmethod
+    def _consulta_fts(texto):
+        """Convertir texto libre en una consulta FTS5 de prefijos ("jua pe" -> "jua"* "pe"*)"""
+        # Solo palabras: así las comillas u operadores que escriba el usuario
+        # no rompen la sintaxis de MATCH
+        palabras = re.findall(r'\w+', texto)
+        return ' '.join(f'"{palabra}"*' for palabra in palabras)
     
     # --- OPERACIONES PARA CITAS ---
     def agregar_cita(self, paciente_id, fecha, notas="", tratamiento=""):
-        """Agregar nueva cita"""
+        """Agregar nueva cita (ValueError si la fecha no es válida)"""
+        fecha_hora = normalizar_fecha(fecha)
         query = '''
-            INSERT INTO citas (paciente_id, fecha, notas, tratamiento)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO citas (paciente_id, fecha, notas, tratamiento, fecha_hora)
+            VALUES (?, ?, ?, ?, ?)
         '''
-        self.cursor.execute(query, (paciente_id, fecha, notas, tratamiento))
-        self.conn.commit()
+        self.cursor.execute(query, (paciente_id, fecha, notas, tratamiento, fecha_hora))
+        self._commit()
         return self.cursor.lastrowid
     
-    def obtener_citas_paciente(self, paciente_id):
-        """Obtener todas las citas de un paciente"""
-        self.cursor.execute('''
-            SELECT * FROM citas 
-            WHERE paciente_id = ? 
-            ORDER BY fecha DESC
-        ''', (paciente_id,))
-        return self.cursor.fetchall()
+    def obtener_citas_paciente(self, paciente_id, despues=None, limite=None):
+        """Obtener las citas de un paciente, de la más reciente a la más antigua
+        
+        Con limite devuelve una página; despues: (fecha_hora, id) de la última cita
+        de la página anterior. Las citas sin fecha_hora van al final.
+        """
+        return self._leer(Cita, *self._sql_citas_paciente(paciente_id, despues, limite))
+    
+    def recorrer_citas_paciente(self, paciente_id):
+        """Generar las citas de un paciente (más recientes primero) sin cargarlas a la vez"""
+        return self._recorrer(Cita, *self._sql_citas_paciente(paciente_id))
+    
+    def _sql_citas_paciente(self, paciente_id, despues=None, limite=None):
+        return self._ordenar(f'SELECT {columnas(Cita)} FROM citas WHERE paciente_id = ?', (paciente_id,),
+                             ("COALESCE(fecha_hora, '')", 'id'), despues, limite, descendente=True)
     
     def obtener_citas_fecha(self, fecha):
-        """Obtener citas de una fecha específica"""
-        self.cursor.execute('SELECT * FROM citas WHERE fecha LIKE ?', (f'{fecha}%',))
-        return self.cursor.fetchall()
+        """Obtener citas de un día ('AAAA-MM-DD') o de un mes ('AAAA-MM')"""
+        if len(fecha) == 7:
+            inicio = datetime.strptime(fecha, "%Y-%m")
+            fin = (inicio + timedelta(days=32)).replace(day=1)
+        else:
+            inicio = datetime.strptime(fecha[:10], "%Y-%m-%d")
+            fin = inicio + timedelta(days=1)
+        return self.obtener_citas_rango(inicio, fin)
+    
+    def obtener_citas_rango(self, desde, hasta, paciente_id=None):
+        """Obtener citas con desde <= fecha_hora < hasta (recorrido de rango por índice)"""
+        parametros = [normalizar_fecha(desde), normalizar_fecha(hasta)]
+        filtro_paciente = ''
+        if paciente_id is not None:
+            filtro_paciente = 'AND paciente_id = ?'
+            parametros.append(paciente_id)
+        return self._leer(Cita, f'''
+            SELECT {columnas(Cita)} FROM citas
+            WHERE fecha_hora >= ? AND fecha_hora < ? {filtro_paciente}
+            ORDER BY fecha_hora
+        ''', parametros)
     
     # --- OPERACIONES PARA FOTOS ---
-    def agregar_foto(self, paciente_id, ruta_archivo, descripcion=""):
-        """Agregar referencia a foto"""
+    def agregar_foto(self, paciente_id, ruta_archivo, descripcion="", hash_archivo=None):
+        """Agregar referencia a foto, generando su miniatura y su versión de visor
+        
+        hash_archivo es el de almacen_fotos.guardar_foto; si otra foto ya usa ese
+        contenido se reutilizan sus variantes en lugar de generarlas otra vez.
+        """
+        variantes = None
+        if hash_archivo:
+            self.cursor.execute('''
+                SELECT ruta_miniatura, ruta_visor FROM fotos
+                WHERE hash = ? AND ruta_miniatura IS NOT NULL AND ruta_visor IS NOT NULL
+                LIMIT 1
+            ''', (hash_archivo,))
+            variantes = self.cursor.fetchone()
+        ruta_miniatura, ruta_visor = variantes or generar_variantes(ruta_archivo)
         fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         query = '''
-            INSERT INTO fotos (paciente_id, fecha, ruta_archivo, descripcion)
-            VALUES (?, ?, ?, ?)
+            INSERT INTO fotos (paciente_id, fecha, ruta_archivo, descripcion, ruta_miniatura, ruta_visor, hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
         '''
-        self.cursor.execute(query, (paciente_id, fecha_actual, ruta_archivo, descripcion))
-        self.conn.commit()
+        with self.transaccion():
+            self._recuperar_archivos([(ruta_archivo, ruta_miniatura, ruta_visor)])
+            self.cursor.execute(query, (paciente_id, fecha_actual, ruta_archivo, descripcion,
+                                        ruta_miniatura, ruta_visor, hash_archivo))
         return self.cursor.lastrowid
     
-    def obtener_fotos_paciente(self, paciente_id):
-        """Obtener todas las fotos de un paciente"""
+    def agregar_fotos(self, paciente_id, fotos, descripcion=""):
+        """Agregar varias fotos ya preparadas en una sola transacción
+        
+        fotos: (hash, ruta_archivo, ruta_miniatura, ruta_visor) por foto, con las
+        variantes ya generadas (almacen_fotos.preparar_foto). Devuelve cuántas se agregaron.
+        """
+        fecha_actual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        filas = [
+            (paciente_id, fecha_actual, ruta_archivo, descripcion, ruta_miniatura, ruta_visor, hash_archivo)
+            for hash_archivo, ruta_archivo, ruta_miniatura, ruta_visor in fotos
+        ]
+        with self.transaccion():
+            self._recuperar_archivos([(ruta, miniatura, visor) for _, _, ruta, _, miniatura, visor, _ in filas])
+            self.cursor.executemany('''
+                INSERT INTO fotos (paciente_id, fecha, ruta_archivo, descripcion, ruta_miniatura, ruta_visor, hash)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', filas)
+        return len(filas)
+    
+    def contar_referencias_foto(self, hash_archivo, ruta=None):
+        """Número de fotos que usan un contenido del almacén
+        
+        Con ruta solo cuenta las que usan ese archivo (original o variante): antes
+        de nombrarlos sin extensión, un mismo hash pudo quedar en varios archivos.
+        """
+        if ruta is None:
+            self.cursor.execute('SELECT COUNT(*) FROM fotos WHERE hash = ?', (hash_archivo,))
+        else:
+            self.cursor.execute('''
+                SELECT COUNT(*) FROM fotos
+                WHERE hash = ? AND ? IN (ruta_archivo, ruta_miniatura, ruta_visor)
+            ''', (hash_archivo, ruta))
+        return self.cursor.fetchone()[0]
+    
+    def obtener_fotos_sin_hash(self):
+        """Obtener (id, ruta_archivo, ruta_miniatura, ruta_visor) de las fotos subidas antes del almacén"""
+        self.cursor.execute('SELECT id, ruta_archivo, ruta_miniatura, ruta_visor FROM fotos WHERE hash IS NULL')
+        return self.cursor.fetchall()
+    
+    def actualizar_archivo_foto(self, foto_id, ruta_archivo, hash_archivo, ruta_miniatura, ruta_visor):
+        """Apuntar una foto a su archivo en el almacén y a las variantes de ese archivo"""
         self.cursor.execute('''
-            SELECT * FROM fotos 
-            WHERE paciente_id = ? 
-            ORDER BY fecha DESC
-        ''', (paciente_id,))
+            UPDATE fotos SET ruta_archivo = ?, hash = ?, ruta_miniatura = ?, ruta_visor = ?
+            WHERE id = ?
+        ''', (ruta_archivo, hash_archivo, ruta_miniatura, ruta_visor, foto_id))
+        self._commit()
+    
+    def obtener_fotos_sin_variantes(self, todas=False):
+        """Obtener (id, ruta_archivo) de las fotos sin miniatura o versión de visor"""
+        if todas:
+            self.cursor.execute('SELECT id, ruta_archivo FROM fotos')
+        else:
+            self.cursor.execute('''
+                SELECT id, ruta_archivo FROM fotos
+                WHERE ruta_miniatura IS NULL OR ruta_visor IS NULL
+            ''')
         return self.cursor.fetchall()
     
+    def actualizar_variantes_foto(self, foto_id, ruta_miniatura, ruta_visor):
+        """Guardar las rutas de las variantes de una foto"""
+        self.cursor.execute(
+            'UPDATE fotos SET ruta_miniatura = ?, ruta_visor = ? WHERE id = ?',
+            (ruta_miniatura, ruta_visor, foto_id)
+        )
+        self._commit()
+    
+    def obtener_fotos_paciente(self, paciente_id, despues=None, limite=None):
+        """Obtener las fotos de un paciente, de la más reciente a la más antigua
+        
+        Con limite devuelve una página; despues: (fecha, id) de la última foto de
+        la página anterior.
+        """
+        return self._leer(Foto, *self._sql_fotos_paciente(paciente_id, despues, limite))
+    
+    def recorrer_fotos_paciente(self, paciente_id):
+        """Generar las fotos de un paciente (más recientes primero) sin cargarlas a la vez"""
+        return self._recorrer(Foto, *self._sql_fotos_paciente(paciente_id))
+    
+    def _sql_fotos_paciente(self, paciente_id, despues=None, limite=None):
+        return self._ordenar(f'SELECT {columnas(Foto)} FROM fotos WHERE paciente_id = ?', (paciente_id,),
+                             ('fecha', 'id'), despues, limite, descendente=True)
+    
     # --- SISTEMA MEJORADO DE ETIQUETAS ---
     
     def obtener_etiquetas_disponibles(self):
@@ -176,7 +1117,7 @@ class Database:
                 'INSERT OR IGNORE INTO etiquetas_disponibles (nombre_etiqueta) VALUES (?)',
                 (nombre_etiqueta,)
             )
-            self.conn.commit()
+            self._commit()
             return True
         except:
             return False
@@ -198,13 +1139,41 @@ class Database:
                     'INSERT OR IGNORE INTO etiquetas_pacientes (paciente_id, etiqueta_id) VALUES (?, ?)',
                     (paciente_id, etiqueta_id)
                 )
-                self.conn.commit()
+                self._commit()
                 return True
             except Exception as e:
                 print(f"Error agregando etiqueta: {e}")
                 return False
         return False
     
+    def sincronizar_etiquetas_paciente(self, paciente_id, etiquetas):
+        """Dejar al paciente exactamente con estas etiquetas (altas y bajas en bloque)"""
+        etiquetas = sorted({e.strip() for e in etiquetas if e and e.strip()})
+        marcadores = ','.join('?' * len(etiquetas))
+        
+        with self.transaccion():
+            if not etiquetas:
+                self.cursor.execute('DELETE FROM etiquetas_pacientes WHERE paciente_id = ?', (paciente_id,))
+                return
+            
+            # Etiquetas nuevas al catálogo
+            self.cursor.executemany(
+                'INSERT OR IGNORE INTO etiquetas_disponibles (nombre_etiqueta) VALUES (?)',
+                [(etiqueta,) for etiqueta in etiquetas]
+            )
+            # Quitar las que ya no están
+            self.cursor.execute(f'''
+                DELETE FROM etiquetas_pacientes
+                WHERE paciente_id = ? AND etiqueta_id NOT IN (
+                    SELECT id FROM etiquetas_disponibles WHERE nombre_etiqueta IN ({marcadores})
+                )
+            ''', (paciente_id, *etiquetas))
+            # Añadir las que faltan
+            self.cursor.execute(f'''
+                INSERT OR IGNORE INTO etiquetas_pacientes (paciente_id, etiqueta_id)
+                SELECT ?, id FROM etiquetas_disponibles WHERE nombre_etiqueta IN ({marcadores})
+            ''', (paciente_id, *etiquetas))
+    
     def obtener_etiquetas_paciente(self, paciente_id):
         """Obtener etiquetas de un paciente (sistema nuevo)"""
         self.cursor.execute('''
@@ -215,15 +1184,25 @@ class Database:
         ''', (paciente_id,))
         return [item[0] for item in self.cursor.fetchall()]
     
-    def buscar_por_etiqueta(self, etiqueta):
-        """Buscar pacientes por etiqueta (sistema nuevo)"""
-        self.cursor.execute('''
-            SELECT p.* FROM pacientes p
+    def buscar_por_etiqueta(self, etiqueta, despues=None, limite=None):
+        """Buscar pacientes por etiqueta, en orden (nombre, id)
+        
+        Con limite devuelve una página; despues: (nombre, id) del último paciente
+        de la página anterior.
+        """
+        return self._leer(ResumenPaciente, *self._sql_por_etiqueta(etiqueta, despues, limite))
+    
+    def recorrer_por_etiqueta(self, etiqueta):
+        """Generar los pacientes con una etiqueta sin cargarlos a la vez"""
+        return self._recorrer(ResumenPaciente, *self._sql_por_etiqueta(etiqueta))
+    
+    def _sql_por_etiqueta(self, etiqueta, despues=None, limite=None):
+        return self._ordenar(f'''
+            SELECT {columnas(ResumenPaciente, 'p')} FROM pacientes p
             JOIN etiquetas_pacientes ep ON p.id = ep.paciente_id
             JOIN etiquetas_disponibles ed ON ep.etiqueta_id = ed.id
             WHERE ed.nombre_etiqueta LIKE ?
-        ''', (f'%{etiqueta}%',))
-        return self.cursor.fetchall()
+        ''', (f'%{etiqueta}%',), ('p.nombre', 'p.id'), despues, limite)
     
     def eliminar_etiqueta_paciente(self, paciente_id, nombre_etiqueta):
         """Eliminar etiqueta de un paciente"""
@@ -234,25 +1213,45 @@ class Database:
                     SELECT id FROM etiquetas_disponibles WHERE nombre_etiqueta = ?
                 )
             ''', (paciente_id, nombre_etiqueta))
-            self.conn.commit()
+            self._commit()
             return True
         except:
             return False
         
     def eliminar_paciente(self, paciente_id):
+        """Eliminar un paciente con sus datos; sus archivos de fotos solo si nadie más los usa"""
         try:
-            # Eliminar en este orden para respetar las claves foráneas
-            self.cursor.execute('DELETE FROM etiquetas_pacientes WHERE paciente_id = ?', (paciente_id,))
-            self.cursor.execute('DELETE FROM fotos WHERE paciente_id = ?', (paciente_id,))
-            self.cursor.execute('DELETE FROM citas WHERE paciente_id = ?', (paciente_id,))
-            self.cursor.execute('DELETE FROM pacientes WHERE id = ?', (paciente_id,))
-            
-            self.conn.commit()
+            self.eliminar_pacientes([paciente_id])
             return True
         except Exception as e:
             print(f"Error eliminando paciente: {e}")
-            self.conn.rollback()
             return False
+    
+    def eliminar_pacientes(self, ids):
+        """Eliminar varios pacientes en una sola transacción; devuelve cuántos existían
+        
+        Citas, fotos y etiquetas se borran en cascada (claves foráneas). Los archivos
+        de sus fotos se anotan en archivos_por_borrar y se borran del disco después
+        de confirmar, si ya ninguna otra foto los usa.
+        """
+        ids = [(paciente_id,) for paciente_id in dict.fromkeys(ids)]
+        with self.transaccion():
+            # Anotar los archivos antes de que la cascada se lleve las filas de fotos
+            for columna in ('ruta_archivo', 'ruta_miniatura', 'ruta_visor'):
+                self.cursor.executemany(f'''
+                    INSERT OR IGNORE INTO archivos_por_borrar (ruta, hash)
+                    SELECT {columna}, hash FROM fotos WHERE paciente_id = ? AND {columna} IS NOT NULL
+                ''', ids)
+            self.cursor.executemany('DELETE FROM pacientes WHERE id = ?', ids)
+            eliminados = self.cursor.rowcount
+            self.hay_archivos_por_borrar = True
+        
+        for (paciente_id,) in ids:
+            self._invalidar_paciente(paciente_id)
+            if self.indice_nombres is not None:
+                self.indice_nombres.eliminar(paciente_id)
+        self._contar_en_indice(eliminados)
+        return eliminados
         
     def cerrar_conexion(self):
         """Cerrar conexión a la base de datos"""
@@ -268,16 +1267,234 @@ class Database:
                 WHERE id = ?
             '''
             self.cursor.execute(query, (nombre, telefono, email, fecha_nacimiento, direccion, paciente_id))
-            self.conn.commit()
+            self._commit()
+            self._invalidar_paciente(paciente_id)
+            if self.indice_nombres is not None and self.cursor.rowcount:
+                self.indice_nombres.agregar(paciente_id, nombre)
+                self._contar_en_indice(self.cursor.rowcount)
             return True
         except Exception as e:
             print(f"Error actualizando paciente: {e}")
             return False
 
+    # --- ESTADÍSTICAS ---
+    def reconstruir_estadisticas(self):
+        """Recalcular las tablas de resumen (tras tocar citas o pacientes a mano)"""
+        with self.transaccion():
+            _reconstruir_estadisticas(self.cursor)
+    
+    def obtener_estadisticas(self, tipo, periodo):
+        """Devolver Estadisticas (citas, pacientes_distintos, pacientes_nuevos) de un periodo
+        
+        tipo: 'dia' ('AAAA-MM-DD'), 'semana' (lunes 'AAAA-MM-DD'), 'mes' ('AAAA-MM') o 'total'
+        """
+        self.cursor.execute('''
+            SELECT citas, pacientes_distintos, pacientes_nuevos FROM estadisticas_periodo
+            WHERE tipo = ? AND periodo = ?
+        ''', (tipo, periodo))
+        return Estadisticas._make(self.cursor.fetchone() or (0, 0, 0))
+    
+    # --- IMPORTACIÓN MASIVA ---
+    # Los registros se leen por lotes de un iterable (memoria constante) y cada
+    # lote se inserta con executemany en una sola transacción.
+    
+    def importar_pacientes(self, registros, tamano_lote=5000, progreso=None, rechazar=None):
+        """Importar pacientes desde un iterable de dicts
+        
+        Claves: nombre (obligatoria), telefono, email, fecha_nacimiento, direccion,
+        etiquetas (lista o texto separado por comas) e id opcional para conservar
+        el del sistema anterior. progreso(resumen) se llama tras cada lote y
+        rechazar(numero, registro, motivo) por cada registro descartado.
+        """
+        resumen = {'procesados': 0, 'insertados': 0, 'rechazados': 0}
+        catalogo = dict(self.cursor.execute('SELECT nombre_etiqueta, id FROM etiquetas_disponibles'))
+        
+        for lote in self._lotes(registros, tamano_lote):
+            validos = []
+            for numero, registro in lote:
+                nombre = str(registro.get('nombre') or '').strip()
+                if not nombre:
+                    self._rechazar(resumen, rechazar, numero, registro, "nombre vacío")
+                    continue
+                try:
+                    paciente_id = int(registro['id']) if registro.get('id') not in (None, '') else None
+                except (TypeError, ValueError):
+                    self._rechazar(resumen, rechazar, numero, registro, "id no numérico")
+                    continue
+                validos.append((numero, registro, paciente_id, nombre))
+            
+            # Descartar ids explícitos que ya existen (en la base o repetidos en el lote)
+            existentes = self._ids_existentes([v[2] for v in validos if v[2] is not None])
+            # Como AUTOINCREMENT: nunca por debajo de sqlite_sequence, para no
+            # reutilizar ids de pacientes borrados
+            siguiente_id = self.cursor.execute('''
+                SELECT MAX(COALESCE((SELECT MAX(id) FROM pacientes), 0),
+                           COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'pacientes'), 0))
+            ''').fetchone()[0] + 1
+            siguiente_id = max([siguiente_id] + [v[2] + 1 for v in validos if v[2] is not None])
+            
+            filas = []
+            etiquetas = []
+            for numero, registro, paciente_id, nombre in validos:
+                if paciente_id is not None:
+                    if paciente_id in existentes:
+                        self._rechazar(resumen, rechazar, numero, registro, f"id {paciente_id} duplicado")
+                        continue
+                    existentes.add(paciente_id)
+                else:
+                    # Ids asignados aquí para poder enlazar las etiquetas sin consultar cada fila
+                    paciente_id = siguiente_id
+                    siguiente_id += 1
+                filas.append((
+                    paciente_id, nombre,
+                    registro.get('telefono') or '', registro.get('email') or '',
+                    registro.get('fecha_nacimiento') or '', registro.get('direccion') or ''
+                ))
+                etiquetas.extend((paciente_id, etiqueta) for etiqueta in self._separar_etiquetas(registro.get('etiquetas')))
+            
+            try:
+                self.cursor.executemany('''
+                    INSERT INTO pacientes (id, nombre, telefono, email, fecha_nacimiento, direccion)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', filas)
+                
+                # Resolver todas las etiquetas del lote contra el catálogo de una vez
+                nuevas = {etiqueta for _, etiqueta in etiquetas if etiqueta not in catalogo}
+                if nuevas:
+                    self.cursor.executemany(
+                        'INSERT OR IGNORE INTO etiquetas_disponibles (nombre_etiqueta) VALUES (?)',
+                        [(etiqueta,) for etiqueta in nuevas]
+                    )
+                    catalogo = dict(self.cursor.execute('SELECT nombre_etiqueta, id FROM etiquetas_disponibles'))
+                self.cursor.executemany(
+                    'INSERT OR IGNORE INTO etiquetas_pacientes (paciente_id, etiqueta_id) VALUES (?, ?)',
+                    [(paciente_id, catalogo[etiqueta]) for paciente_id, etiqueta in etiquetas]
+                )
+                self._commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            
+            if self.indice_nombres is not None:
+                for fila in filas:
+                    self.indice_nombres.agregar(fila[0], fila[1])
+                self._contar_en_indice(len(filas))
+            resumen['procesados'] += len(lote)
+            resumen['insertados'] += len(filas)
+            if progreso:
+                progreso(resumen)
+        
+        return resumen
+    
+    def importar_citas(self, registros, tamano_lote=5000, progreso=None, rechazar=None):
+        """Importar citas desde un iterable de dicts
+        
+        Claves: paciente_id y fecha (obligatorias), notas y tratamiento.
+        progreso y rechazar funcionan igual que en importar_pacientes.
+        """
+        resumen = {'procesados': 0, 'insertados': 0, 'rechazados': 0}
+        
+        for lote in self._lotes(registros, tamano_lote):
+            validos = []
+            for numero, registro in lote:
+                fecha = str(registro.get('fecha') or '').strip()
+                try:
+                    fecha_hora = normalizar_fecha(fecha)
+                except ValueError as e:
+                    self._rechazar(resumen, rechazar, numero, registro, str(e))
+                    continue
+                try:
+                    paciente_id = int(registro.get('paciente_id'))
+                except (TypeError, ValueError):
+                    self._rechazar(resumen, rechazar, numero, registro, "paciente_id no numérico")
+                    continue
+                validos.append((numero, registro, paciente_id, fecha, fecha_hora))
+            
+            existentes = self._ids_existentes([v[2] for v in validos])
+            filas = []
+            for numero, registro, paciente_id, fecha, fecha_hora in validos:
+                if paciente_id not in existentes:
+                    self._rechazar(resumen, rechazar, numero, registro, f"paciente {paciente_id} no existe")
+                    continue
+                filas.append((paciente_id, fecha, registro.get('notas') or '', registro.get('tratamiento') or '', fecha_hora))
+            
+            try:
+                self.cursor.executemany('''
+                    INSERT INTO citas (paciente_id, fecha, notas, tratamiento, fecha_hora)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', filas)
+                self._commit()
+            except Exception:
+                self.conn.rollback()
+                raise
+            
+            resumen['procesados'] += len(lote)
+            resumen['insertados'] += len(filas)
+            if progreso:
+                progreso(resumen)
+        
+        return resumen
+    
+    @staticmethod
+    def _lotes(registros, tamano_lote):
+        """Partir un iterable en listas de (número de registro, registro)"""
+        numerados = enumerate(registros, 1)
+        while True:
+            lote = list(islice(numerados, tamano_lote))
+            if not lote:
+                return
+            yield lote
+    
+    @staticmethod
+    def _rechazar(resumen, rechazar, numero, registro, motivo):
+        resumen['rechazados'] += 1
+        if rechazar:
+            rechazar(numero, registro, motivo)
+    
+    @staticmethod
+    def _separar_etiquetas(etiquetas):
+        """Aceptar etiquetas como lista o como texto separado por comas o punto y coma"""
+        if not etiquetas:
+            return []
+        if isinstance(etiquetas, str):
+            etiquetas = re.split(r'[,;]', etiquetas)
+        return [e.strip() for e in etiquetas if e and e.strip()]
+    
+    def _ids_existentes(self, ids):
+        """Devolver el subconjunto de ids que ya existen en pacientes"""
+        existentes = set()
+        ids = list(set(ids))
+        # Grupos de 500 para no pasar el límite de parámetros de SQLite
+        for i in range(0, len(ids), 500):
+            grupo = ids[i:i + 500]
+            marcadores = ','.join('?' * len(grupo))
+            self.cursor.execute(f'SELECT id FROM pacientes WHERE id IN ({marcadores})', grupo)
+            existentes.update(fila[0] for fila in self.cursor.fetchall())
+        return existentes
+
 # Probar la base de datos
 if __name__ == "__main__":
+    import sys
+    
     db = Database()
     
+    # python database.py --reconstruir-estadisticas
+    if '--reconstruir-estadisticas' in sys.argv[1:]:
+        db.reconstruir_estadisticas()
+        print("Estadísticas reconstruidas")
+        sys.exit()
+    
+    # python database.py --borrar-archivos-pendientes
+    if '--borrar-archivos-pendientes' in sys.argv[1:]:
+        borrados = 0
+        while True:
+            resueltos = db.borrar_archivos_pendientes()
+            borrados += resueltos
+            if not resueltos:
+                break
+        print(f"Archivos pendientes resueltos: {borrados}")
+        sys.exit()
+    
     # Ejemplos de uso
     paciente_id = db.agregar_paciente("Juan Pérez", "123456789", "juan@email.com")
     print(f"Paciente agregado con ID: {paciente_id}")
@@ -286,8 +1503,9 @@ if __name__ == "__main__":
     db.agregar_etiqueta_paciente(paciente_id, "diabetes")
     db.agregar_etiqueta_paciente(paciente_id, "uñero")
     
-    pacientes = db.obtener_pacientes()
-    print("Pacientes:", pacientes)
+    print("Pacientes:")
+    for paciente in db.recorrer_pacientes():
+        print("  ", paciente)
     
     etiquetas = db.obtener_etiquetas_disponibles()
     print("Etiquetas disponibles:", etiquetas)
\ No newline at end of file
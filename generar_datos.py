@@ -0,0 +1,222 @@
+import argparse
+import os
+import random
+import sys
+import unicodedata
+from datetime import date, datetime, timedelta
+from database import Database
+
+# Tamaños de clínica de referencia (número de pacientes)
+TAMANOS = {
+    'pequena': 10_000,
+    'mediana': 100_000,
+    'grande': 1_000_000,
+}
+
+NOMBRES = [
+    'María', 'Carmen', 'Josefa', 'Isabel', 'Ana', 'Laura', 'Lucía', 'Pilar', 'Dolores', 'Cristina',
+    'Marta', 'Elena', 'Rosa', 'Teresa', 'Sara', 'Paula', 'Sofía', 'Raquel', 'Mercedes', 'Concepción',
+    'Antonio', 'José', 'Manuel', 'Francisco', 'Juan', 'David', 'Javier', 'Daniel', 'Carlos', 'Jesús',
+    'Miguel', 'Rafael', 'Pedro', 'Ángel', 'Alejandro', 'Fernando', 'Pablo', 'Luis', 'Sergio', 'Jorge',
+]
+
+APELLIDOS = [
+    'García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez', 'Pérez', 'Gómez',
+    'Martín', 'Jiménez', 'Ruiz', 'Hernández', 'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Alonso',
+    'Gutiérrez', 'Navarro', 'Torres', 'Domínguez', 'Vázquez', 'Ramos', 'Gil', 'Ramírez', 'Serrano',
+    'Blanco', 'Molina', 'Morales', 'Suárez', 'Ortega', 'Delgado', 'Castro', 'Ortiz', 'Rubio', 'Marín',
+    'Sanz', 'Núñez', 'Iglesias', 'Medina', 'Garrido', 'Cortés', 'Castillo', 'Santos', 'Lozano', 'Guerrero',
+]
+
+CALLES = ['Calle Mayor', 'Avenida de la Constitución', 'Calle Real', 'Plaza de España', 'Calle del Sol',
+          'Calle San José', 'Avenida de Andalucía', 'Calle Nueva', 'Camino Viejo', 'Calle de la Iglesia']
+
+DOMINIOS = ['gmail.com', 'hotmail.com', 'yahoo.es', 'outlook.com', 'telefonica.net']
+
+# (etiqueta, peso): las patologías frecuentes aparecen mucho más que las raras
+ETIQUETAS = [
+    ('adulto mayor', 30), ('callos', 25), ('hongos', 20), ('uñero', 18), ('diabetes', 15),
+    ('diabético', 10), ('juanetes', 12), ('pie plano', 8), ('anciano', 10), ('deportista', 7),
+    ('espolón', 5), ('circulación', 6), ('niño', 4), ('postoperatorio', 2),
+]
+
+# (tratamiento, peso)
+TRATAMIENTOS = [
+    ('Quiropodia', 40), ('Revisión', 25), ('Tratamiento de onicomicosis', 10), ('Uña encarnada', 8),
+    ('Estudio de la pisada', 6), ('Plantillas a medida', 5), ('Evaluación inicial', 4),
+    ('Cirugía ungueal', 1), ('', 6),
+]
+
+NOTAS = ['', '', '', 'Sin incidencias', 'Mejoría notable', 'Repetir en un mes', 'Dolor al caminar',
+         'Revisar evolución', 'Paciente derivado', 'Cura local']
+
+
+def sin_acentos(texto):
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def generar_pacientes(total, semilla):
+    """Generar total pacientes con ids 1..total (misma semilla = mismos datos)"""
+    rng = random.Random(semilla)
+    nombres_etiquetas = [e for e, _ in ETIQUETAS]
+    pesos_etiquetas = [p for _, p in ETIQUETAS]
+
+    for paciente_id in range(1, total + 1):
+        nombre = rng.choice(NOMBRES)
+        apellido1, apellido2 = rng.choice(APELLIDOS), rng.choice(APELLIDOS)
+
+        email = ''
+        if rng.random() < 0.7:
+            usuario = sin_acentos(f"{nombre}.{apellido1}{rng.randint(1, 999)}").lower()
+            email = f"{usuario}@{rng.choice(DOMINIOS)}"
+
+        # La mayoría de pacientes de podología son personas mayores
+        nacimiento = date(int(rng.triangular(1930, 2020, 1955)), rng.randint(1, 12), rng.randint(1, 28))
+
+        # 0 a 3 etiquetas, sin repetir
+        cuantas = rng.choices([0, 1, 2, 3], weights=[35, 35, 20, 10])[0]
+        etiquetas = set(rng.choices(nombres_etiquetas, weights=pesos_etiquetas, k=cuantas))
+
+        yield {
+            'id': paciente_id,
+            'nombre': f"{nombre} {apellido1} {apellido2}",
+            'telefono': f"{rng.choice('69')}{rng.randint(10000000, 99999999)}" if rng.random() < 0.95 else '',
+            'email': email,
+            'fecha_nacimiento': nacimiento.isoformat(),
+            'direccion': f"{rng.choice(CALLES)}, {rng.randint(1, 150)}",
+            'etiquetas': sorted(etiquetas),
+        }
+
+
+def generar_citas(total_pacientes, semilla, referencia, media_citas=8, anos=3):
+    """Generar el historial de citas de cada paciente
+
+    El número de citas por paciente sigue una exponencial de media media_citas
+    (muchos pacientes con pocas visitas y unos pocos muy frecuentes). La primera
+    visita cae en los últimos anos años y las siguientes se separan ~45 días;
+    algunas quedan en los próximos 60 días como citas pendientes.
+    """
+    rng = random.Random(semilla + 1)
+    nombres_tratamientos = [t for t, _ in TRATAMIENTOS]
+    pesos_tratamientos = [p for _, p in TRATAMIENTOS]
+    inicio = datetime.combine(referencia, datetime.min.time()) - timedelta(days=365 * anos)
+    limite = datetime.combine(referencia, datetime.min.time()) + timedelta(days=60)
+
+    for paciente_id in range(1, total_pacientes + 1):
+        cuantas = int(rng.expovariate(1 / media_citas)) + 1
+        momento = inicio + timedelta(days=rng.uniform(0, 365 * anos))
+        for _ in range(cuantas):
+            if momento > limite:
+                break
+            # Horario de consulta: de lunes a sábado, de 9:00 a 19:30 cada media hora
+            if momento.weekday() == 6:
+                momento += timedelta(days=1)
+            hora = momento.replace(hour=rng.randint(9, 19), minute=rng.choice((0, 30)), second=0, microsecond=0)
+            yield {
+                'paciente_id': paciente_id,
+                'fecha': hora.strftime("%Y-%m-%d %H:%M"),
+                'notas': rng.choice(NOTAS),
+                'tratamiento': rng.choices(nombres_tratamientos, weights=pesos_tratamientos)[0],
+            }
+            momento += timedelta(days=max(1.0, rng.expovariate(1 / 45)))
+
+
+def generar_fotos(total_pacientes, semilla, referencia):
+    """Filas de fotos: una cuarta parte de los pacientes tiene de 1 a 6
+
+    Solo se generan las filas (las rutas no existen en disco): sirven para medir
+    las consultas, no la decodificación de imágenes.
+    """
+    rng = random.Random(semilla + 2)
+    for paciente_id in range(1, total_pacientes + 1):
+        if rng.random() >= 0.25:
+            continue
+        for n in range(rng.randint(1, 6)):
+            fecha = referencia - timedelta(days=rng.randint(0, 365 * 3))
+            ruta = f"data/fotos/sinteticas/{paciente_id}_{n}.jpg"
+            yield (paciente_id, f"{fecha.isoformat()} 10:00:00", ruta, rng.choice(['', 'Antes', 'Después', 'Evolución']))
+
+
+def generar_base(ruta_db, pacientes, semilla=42, referencia=None, media_citas=8, tamano_lote=20000, progreso=None):
+    """Crear en ruta_db una base sintética; devuelve un resumen de lo insertado
+
+    Con la misma semilla y fecha de referencia el contenido es idéntico.
+    """
+    if os.path.exists(ruta_db):
+        raise FileExistsError(f"{ruta_db} ya existe; bórralo o usa otra ruta")
+    referencia = referencia or date.today()
+
+    db = Database(ruta_db)
+    try:
+        resumen = {'semilla': semilla, 'referencia': referencia.isoformat()}
+        resumen['pacientes'] = db.importar_pacientes(
+            generar_pacientes(pacientes, semilla), tamano_lote, progreso and (lambda r: progreso('pacientes', r))
+        )['insertados']
+        resumen['citas'] = db.importar_citas(
+            generar_citas(pacientes, semilla, referencia, media_citas), tamano_lote,
+            progreso and (lambda r: progreso('citas', r))
+        )['insertados']
+
+        fotos = 0
+        filas = []
+        for fila in generar_fotos(pacientes, semilla, referencia):
+            filas.append(fila)
+            if len(filas) >= tamano_lote:
+                fotos += _insertar_fotos(db, filas)
+                filas = []
+        fotos += _insertar_fotos(db, filas)
+        resumen['fotos'] = fotos
+
+        # Dejar las estadísticas del planificador al día para las consultas
+        db.cursor.execute('ANALYZE')
+        db.conn.commit()
+    finally:
+        db.cerrar_conexion()
+    return resumen
+
+
+def _insertar_fotos(db, filas):
+    with db.transaccion():
+        db.cursor.executemany('''
+            INSERT INTO fotos (paciente_id, fecha, ruta_archivo, descripcion)
+            VALUES (?, ?, ?, ?)
+        ''', filas)
+    return len(filas)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Generar una base de datos sintética de la clínica")
+    parser.add_argument('ruta', help="archivo .db a crear (no debe existir)")
+    parser.add_argument('--tamano', choices=TAMANOS, default='pequena')
+    parser.add_argument('--pacientes', type=int, help="número exacto de pacientes (anula --tamano)")
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--referencia', type=date.fromisoformat,
+                        help="fecha 'de hoy' para las citas (AAAA-MM-DD, por defecto hoy)")
+    parser.add_argument('--media-citas', type=float, default=8, help="citas medias por paciente")
+    args = parser.parse_args(argumentos)
+
+    fase = [None]
+
+    def progreso(tipo, resumen):
+        if fase[0] not in (None, tipo):
+            print()
+        fase[0] = tipo
+        print(f"\r{tipo}: {resumen['insertados']}", end='', flush=True)
+
+    total = args.pacientes or TAMANOS[args.tamano]
+    try:
+        resumen = generar_base(args.ruta, total, args.semilla, args.referencia, args.media_citas, progreso=progreso)
+    except FileExistsError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"\nBase generada en {args.ruta}: {resumen['pacientes']} pacientes, "
+          f"{resumen['citas']} citas, {resumen['fotos']} fotos (semilla {resumen['semilla']}, "
+          f"referencia {resumen['referencia']})")
+    return 0
+
+
+# Ejemplos:
+#   python generar_datos.py data/bench_10k.db
+#   python generar_datos.py data/bench_1m.db --tamano grande --semilla 7 --referencia 2025-01-01
+if __name__ == "__main__":
+    sys.exit(main())
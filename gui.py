@@ -1,8 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 from database import Database
-from PIL import Image, ImageTk
+from registros import PACIENTE_VACIO
+from acceso_datos import AccesoDatos
+from almacen_fotos import preparar_foto, eliminar_archivos
+import instrumentacion
+from lista_virtual import ListaPacientesVirtual
+from reconciliar import ReconciliadorHijos, ReconciliadorTreeview
+from imagenes import TAMANO_MINIATURA, CacheImagenes, cargar_miniatura, cargar_para_visor
+from PIL import ImageTk
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import os
+import queue
+import re
 from datetime import datetime
 
 class PodologiaApp:
@@ -16,7 +26,41 @@ class PodologiaApp:
         
         # Variables
         self.paciente_actual = None
-        self.foto_actual = None
+        self.fotos_seleccionadas = []
+        
+        # Búsqueda mientras se escribe: se lanza tras una pausa sin teclear
+        self.retardo_busqueda = 150  # ms
+        self.max_resultados_nombre = 500
+        self.busqueda_programada = None
+        self.ultima_busqueda = ''
+        
+        # Citas y fotos se cargan solo cuando su pestaña está a la vista. Para cada
+        # pestaña se guarda el paciente cuyos datos muestra (None = hay que recargar)
+        self.paciente_mostrado = None
+        self.pestanas_cargadas = {'citas': None, 'fotos': None}
+        
+        # Trabajo en segundo plano: los hilos dejan aquí funciones que se
+        # ejecutan en el hilo de Tk (Tkinter no es seguro entre hilos)
+        self.cola_ui = queue.Queue()
+        self.pool_imagenes = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        self.tareas_miniaturas = []
+        self.generacion_miniaturas = 0
+        # Copia al almacén y variantes de las fotos subidas (se crea en la primera subida)
+        self.pool_procesos = None
+        
+        # Visor: imágenes ya listas para mostrar y precarga de las vecinas
+        self.cache_visor = CacheImagenes()
+        self.fotos_precarga = 2
+        self.precargas_visor = set()
+        
+        # Asistente IA: una sola instancia (conexión de solo lectura) y un hilo propio
+        self.asistente = None
+        self.pool_ia = ThreadPoolExecutor(max_workers=1)
+        
+        # Hilo de datos: lecturas de la ficha y todas las escrituras, fuera del bucle de Tk
+        self.datos = AccesoDatos(self.ejecutar_en_ui, self.db.ruta_db, self.db.perfil)
+        self.root.protocol("WM_DELETE_WINDOW", self.cerrar)
+        self.procesar_cola_ui()
         
         self.crear_interfaz()
         self.actualizar_lista_pacientes()
@@ -26,14 +70,41 @@ class PodologiaApp:
     
     def cargar_primer_paciente(self):
         """Cargar automáticamente el primer paciente al iniciar"""
-        pacientes = self.db.obtener_pacientes()
-        if pacientes:
-            # Seleccionar el primer paciente de la lista
-            self.lista_pacientes.selection_set(0)
-            self.lista_pacientes.see(0)
+        # Seleccionar el primer paciente de la lista (si hay alguno)
+        if self.lista_pacientes.seleccionar_primero() is not None:
             # Forzar la selección
             self.seleccionar_paciente(None)
 
+    def cerrar(self):
+        """Cancelar trabajos pendientes, cerrar la base de datos y salir"""
+        for tarea in self.tareas_miniaturas:
+            tarea.cancel()
+        self.pool_imagenes.shutdown(wait=False)
+        if self.pool_procesos:
+            self.pool_procesos.shutdown(wait=False)
+        self.pool_ia.shutdown(wait=False)
+        if self.asistente:
+            self.asistente.cerrar()
+        self.datos.cerrar()
+        self.db.cerrar_conexion()
+        if instrumentacion.ACTIVA and instrumentacion.exportar():
+            print(f"Métricas guardadas en {instrumentacion.ARCHIVO_METRICAS}")
+        self.root.destroy()
+    
+    def ejecutar_en_ui(self, funcion, *args):
+        """Encolar una llamada para el hilo de Tk (se puede usar desde cualquier hilo)"""
+        self.cola_ui.put((funcion, args))
+    
+    def procesar_cola_ui(self):
+        """Ejecutar lo que los hilos de fondo dejaron en la cola"""
+        try:
+            while True:
+                funcion, args = self.cola_ui.get_nowait()
+                funcion(*args)
+        except queue.Empty:
+            pass
+        self.root.after(30, self.procesar_cola_ui)
+
     def crear_interfaz(self):
         # Frame principal
         main_frame = ttk.Frame(self.root, padding="10")
@@ -53,17 +124,13 @@ class PodologiaApp:
         ttk.Label(left_frame, text="Buscar:").grid(row=0, column=0, sticky=tk.W)
         self.buscar_entry = ttk.Entry(left_frame, width=20)
         self.buscar_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), pady=5)
-        self.buscar_entry.bind('<KeyRelease>', self.buscar_pacientes)
-        
-        # Lista de pacientes
-        self.lista_pacientes = tk.Listbox(left_frame, width=30, height=20)
-        self.lista_pacientes.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
-        self.lista_pacientes.bind('<<ListboxSelect>>', self.seleccionar_paciente)
+        self.buscar_entry.bind('<KeyRelease>', self.programar_busqueda)
+        self.buscar_entry.bind('<Return>', self.buscar_pacientes)
         
-        # Scrollbar para lista
-        scrollbar = ttk.Scrollbar(left_frame, orient=tk.VERTICAL, command=self.lista_pacientes.yview)
-        scrollbar.grid(row=1, column=2, sticky=(tk.N, tk.S))
-        self.lista_pacientes.configure(yscrollcommand=scrollbar.set)
+        # Lista de pacientes (virtual: solo carga las filas visibles, con su propio scrollbar)
+        self.lista_pacientes = ListaPacientesVirtual(left_frame, self.db, al_seleccionar=self.seleccionar_paciente,
+                                                     width=30, height=20)
+        self.lista_pacientes.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
         
         # Botones de pacientes
         btn_frame = ttk.Frame(left_frame)
@@ -73,6 +140,11 @@ class PodologiaApp:
         ttk.Button(btn_frame, text="Editar", command=self.editar_paciente).pack(side=tk.LEFT, fill=tk.X, expand=True)
         ttk.Button(btn_frame, text="Eliminar", command=self.eliminar_paciente).pack(side=tk.LEFT, fill=tk.X, expand=True)
         
+        # Aviso cuando la lista muestra nombres parecidos y no coincidencias
+        self.aviso_busqueda_var = tk.StringVar()
+        ttk.Label(left_frame, textvariable=self.aviso_busqueda_var, wraplength=220).grid(
+            row=3, column=0, columnspan=2, sticky=tk.W)
+        
         # Configurar grid left frame
         left_frame.columnconfigure(1, weight=1)
         left_frame.rowconfigure(1, weight=1)
@@ -99,25 +171,37 @@ class PodologiaApp:
         ttk.Label(self.right_frame, text="Etiquetas:").grid(row=3, column=0, sticky=tk.W, pady=2)
         self.etiquetas_frame = ttk.Frame(self.right_frame)
         self.etiquetas_frame.grid(row=3, column=1, sticky=(tk.W, tk.E), pady=2)
+        self.etiquetas_chips = ReconciliadorHijos(
+            self.etiquetas_frame,
+            lambda frame, etiqueta: ttk.Label(frame, text=etiqueta, background='lightblue', padding="2 0"),
+            padx=2
+        )
         
         # --- NOTEBOOK para pestañas ---
-        notebook = ttk.Notebook(main_frame)
-        notebook.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
+        self.notebook = ttk.Notebook(main_frame)
+        self.notebook.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         
         # Pestaña de Citas
-        self.citas_frame = ttk.Frame(notebook, padding="10")
-        notebook.add(self.citas_frame, text="Citas")
+        self.citas_frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(self.citas_frame, text="Citas")
         self.crear_pestana_citas()
         
         # Pestaña de Fotos
-        self.fotos_frame = ttk.Frame(notebook, padding="10")
-        notebook.add(self.fotos_frame, text="Fotos")
+        self.fotos_frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(self.fotos_frame, text="Fotos")
         self.crear_pestana_fotos()
         
         # Pestaña de Búsqueda con IA
-        self.ia_frame = ttk.Frame(notebook, padding="10")
-        notebook.add(self.ia_frame, text="Asistente IA")
+        self.ia_frame = ttk.Frame(self.notebook, padding="10")
+        self.notebook.add(self.ia_frame, text="Asistente IA")
         self.crear_pestana_ia()
+        
+        # Pestañas con datos del paciente: nombre y función que las carga
+        self.pestanas = {
+            str(self.citas_frame): ('citas', self.actualizar_citas_paciente),
+            str(self.fotos_frame): ('fotos', self.actualizar_fotos_paciente),
+        }
+        self.notebook.bind('<<NotebookTabChanged>>', self.cargar_pestana_visible)
     
     def crear_pestana_citas(self):
         """Crear interfaz para gestión de citas"""
@@ -161,6 +245,8 @@ class PodologiaApp:
         scrollbar = ttk.Scrollbar(citas_list_frame, orient=tk.VERTICAL, command=self.citas_tree.yview)
         scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         self.citas_tree.configure(yscrollcommand=scrollbar.set)
+        # Filas con el id de la cita como iid: al refrescar solo cambian las nuevas o editadas
+        self.citas_filas = ReconciliadorTreeview(self.citas_tree)
         
         self.citas_frame.columnconfigure(0, weight=1)
         self.citas_frame.rowconfigure(1, weight=1)
@@ -172,13 +258,21 @@ class PodologiaApp:
         subir_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         subir_frame.columnconfigure(1, weight=1)
         
-        ttk.Button(subir_frame, text="Seleccionar Foto", command=self.seleccionar_foto).grid(row=0, column=0, pady=5)
+        ttk.Button(subir_frame, text="Seleccionar Fotos", command=self.seleccionar_foto).grid(row=0, column=0, pady=5)
+        self.fotos_seleccionadas_var = tk.StringVar()
+        ttk.Label(subir_frame, textvariable=self.fotos_seleccionadas_var).grid(row=0, column=1, sticky=tk.W, padx=5)
         
         ttk.Label(subir_frame, text="Descripción:").grid(row=1, column=0, sticky=tk.W)
         self.descripcion_foto = ttk.Entry(subir_frame)
         self.descripcion_foto.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=5)
         
-        ttk.Button(subir_frame, text="Subir Foto", command=self.subir_foto).grid(row=2, column=1, sticky=tk.E, pady=5)
+        self.boton_subir = ttk.Button(subir_frame, text="Subir Fotos", command=self.subir_foto)
+        self.boton_subir.grid(row=2, column=1, sticky=tk.E, pady=5)
+        
+        # Solo visible durante una subida
+        self.progreso_fotos = ttk.Progressbar(subir_frame, mode='determinate')
+        self.progreso_fotos.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E), pady=(0, 5))
+        self.progreso_fotos.grid_remove()
         
         # Visualización de fotos
         fotos_view_frame = ttk.LabelFrame(self.fotos_frame, text="Fotos del Paciente", padding="5")
@@ -193,6 +287,9 @@ class PodologiaApp:
         scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
         self.fotos_canvas.configure(yscrollcommand=scrollbar.set)
         
+        # Hueco en blanco que se muestra mientras se decodifica cada miniatura
+        self.miniatura_vacia = tk.PhotoImage(width=TAMANO_MINIATURA[0], height=TAMANO_MINIATURA[1])
+        
         self.fotos_inner_frame = ttk.Frame(self.fotos_canvas)
         self.fotos_canvas.create_window((0, 0), window=self.fotos_inner_frame, anchor="nw")
         
@@ -207,7 +304,8 @@ class PodologiaApp:
         self.pregunta_ia.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
         self.pregunta_ia.insert('1.0', "Ej: ¿Cuántos pacientes tuve la semana pasada?")
         
-        ttk.Button(self.ia_frame, text="Preguntar", command=self.procesar_pregunta_ia).grid(row=2, column=0, sticky=tk.E)
+        self.boton_preguntar = ttk.Button(self.ia_frame, text="Preguntar", command=self.procesar_pregunta_ia)
+        self.boton_preguntar.grid(row=2, column=0, sticky=tk.E)
         
         self.respuesta_ia = tk.Text(self.ia_frame, height=10, width=60, state=tk.DISABLED)
         self.respuesta_ia.grid(row=3, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
@@ -219,108 +317,179 @@ class PodologiaApp:
     
     def actualizar_lista_pacientes(self):
         """Actualizar lista de pacientes"""
-        self.lista_pacientes.delete(0, tk.END)
-        pacientes = self.db.obtener_pacientes()
-        for paciente in pacientes:
-            self.lista_pacientes.insert(tk.END, f"{paciente[0]} - {paciente[1]}")
+        if self.lista_pacientes.resultados is not None:
+            # Resultados por parecido: se repite la búsqueda (el índice ya tiene el cambio)
+            self.buscar_pacientes()
+        else:
+            self.lista_pacientes.refrescar()
+    
+    def programar_busqueda(self, event=None):
+        """Buscar cuando se deja de teclear un momento (cada tecla reinicia la espera)"""
+        if self.busqueda_programada is not None:
+            self.root.after_cancel(self.busqueda_programada)
+            self.busqueda_programada = None
+        # Flechas, mayúsculas... o volver al texto ya mostrado: no hay nada que buscar
+        if self.buscar_entry.get().strip() == self.ultima_busqueda:
+            return
+        self.busqueda_programada = self.root.after(self.retardo_busqueda, self.buscar_pacientes)
     
     def buscar_pacientes(self, event=None):
-        """Buscar pacientes por nombre"""
-        busqueda = self.buscar_entry.get()
-        if busqueda:
-            pacientes = self.db.buscar_paciente(busqueda)
-            self.lista_pacientes.delete(0, tk.END)
-            for paciente in pacientes:
-                self.lista_pacientes.insert(tk.END, f"{paciente[0]} - {paciente[1]}")
-        else:
-            self.actualizar_lista_pacientes()
+        """Buscar pacientes por nombre (tolerando erratas), teléfono, email o dirección"""
+        if self.busqueda_programada is not None:
+            self.root.after_cancel(self.busqueda_programada)
+            self.busqueda_programada = None
+        tramo = instrumentacion.tramo('buscar_pacientes')
+        busqueda = self.ultima_busqueda = self.buscar_entry.get().strip()
+        limite = self.lista_pacientes.tamano_carga()
+        
+        def buscar(db):
+            # Primero las coincidencias por prefijo (FTS), paginadas. Solo si no hay
+            # ninguna y parece un nombre (sin cifras ni @) se buscan nombres parecidos
+            # en el índice en memoria, por si hay una errata
+            total = db.contar_pacientes(busqueda)
+            if not total and busqueda and not re.search(r'[\d@]', busqueda):
+                parecidos = db.buscar_por_nombre(busqueda, limite=self.max_resultados_nombre + 1)
+                if parecidos:
+                    return True, len(parecidos), parecidos[:self.max_resultados_nombre]
+            return False, total, db.obtener_pacientes_pagina(busqueda, limite=limite)
+        
+        def mostrar(resultado):
+            por_parecido, total, filas = resultado
+            if por_parecido:
+                self.lista_pacientes.mostrar_resultados(busqueda, filas)
+                aviso = f"Sin coincidencias para «{busqueda}»; nombres parecidos"
+                if total > len(filas):
+                    aviso += f" (los {len(filas)} más parecidos)"
+                self.aviso_busqueda_var.set(aviso)
+            else:
+                self.lista_pacientes.aplicar_filtro(busqueda, total, filas)
+                self.aviso_busqueda_var.set("")
+        
+        # Una búsqueda nueva deja sin efecto la que aún no se haya atendido
+        self.datos.pedir(buscar, al_terminar=tramo.envolver(mostrar), clave='busqueda')
     
     def seleccionar_paciente(self, event):
         """Cuando se selecciona un paciente de la lista"""
-        selection = self.lista_pacientes.curselection()
-        if selection:
-            index = selection[0]
-            paciente_str = self.lista_pacientes.get(index)
-            paciente_id = int(paciente_str.split(' - ')[0])
-            
-            # Obtener datos del paciente
-            pacientes = self.db.obtener_pacientes()
-            for paciente in pacientes:
-                if paciente[0] == paciente_id:
-                    self.paciente_actual = paciente
-                    self.mostrar_info_paciente(paciente)
-                    break
+        paciente_id = self.lista_pacientes.id_seleccionado()
+        if paciente_id is not None:
+            # Obtener datos del paciente (al cambiar rápido, las peticiones anteriores se descartan)
+            tramo = instrumentacion.tramo('seleccionar_paciente')
+            self.datos.pedir(Database.obtener_paciente, paciente_id,
+                             al_terminar=tramo.envolver(self.paciente_cargado), clave='paciente')
+    
+    def paciente_cargado(self, paciente):
+        """Mostrar el paciente recibido del hilo de datos"""
+        if paciente:
+            self.paciente_actual = paciente
+            self.mostrar_info_paciente(paciente)
     
     def mostrar_info_paciente(self, paciente):
         """Mostrar información del paciente seleccionado"""
-        self.nombre_var.set(paciente[1])
-        self.telefono_var.set(paciente[2] or "")
-        self.email_var.set(paciente[3] or "")
+        self.nombre_var.set(paciente.nombre)
+        self.telefono_var.set(paciente.telefono or "")
+        self.email_var.set(paciente.email or "")
         
-        # Mostrar etiquetas
-        for widget in self.etiquetas_frame.winfo_children():
-            widget.destroy()
-        
-        etiquetas = self.db.obtener_etiquetas_paciente(paciente[0])
-        for i, etiqueta in enumerate(etiquetas):
-            ttk.Label(self.etiquetas_frame, text=etiqueta, 
-                     background='lightblue', padding="2 0").grid(row=0, column=i, padx=2)
-        
-        # Actualizar citas
-        self.actualizar_citas_paciente(paciente[0])
+        # Etiquetas, citas y fotos llegan por separado desde el hilo de datos
+        self.datos.pedir(Database.obtener_etiquetas_paciente, paciente.id,
+                         al_terminar=self.mostrar_etiquetas, clave='etiquetas')
         
-        # Actualizar fotos
-        self.actualizar_fotos_paciente(paciente[0])
+        # De citas y fotos solo se carga la pestaña visible; las demás al mostrarlas
+        self.paciente_mostrado = paciente.id
+        self.cargar_pestana_visible()
+    
+    def cargar_pestana_visible(self, event=None):
+        """Cargar la pestaña a la vista si muestra otro paciente o quedó marcada como sucia"""
+        pestana = self.pestanas.get(self.notebook.select())
+        if pestana is None or self.paciente_mostrado is None:
+            return
+        nombre, cargar = pestana
+        if self.pestanas_cargadas[nombre] != self.paciente_mostrado:
+            self.pestanas_cargadas[nombre] = self.paciente_mostrado
+            cargar(self.paciente_mostrado)
+    
+    def marcar_pestanas_sucias(self, paciente_id, *nombres):
+        """Tras cambiar datos de un paciente, recargar esas pestañas (ahora o al mostrarlas)"""
+        for nombre in nombres:
+            if self.pestanas_cargadas[nombre] == paciente_id:
+                self.pestanas_cargadas[nombre] = None
+        self.cargar_pestana_visible()
+    
+    def mostrar_etiquetas(self, etiquetas):
+        """Pintar las etiquetas del paciente"""
+        self.etiquetas_chips.aplicar((etiqueta, etiqueta) for etiqueta in etiquetas)
     
     def actualizar_citas_paciente(self, paciente_id):
         """Actualizar lista de citas del paciente"""
-        # Limpiar treeview
-        for item in self.citas_tree.get_children():
-            self.citas_tree.delete(item)
+        def filas_citas(db, paciente_id):
+            # Se recorren en el hilo de datos y a Tk solo llega lo que muestra la tabla
+            return [(cita.id, (cita.fecha, cita.tratamiento, cita.notas)) for cita in db.recorrer_citas_paciente(paciente_id)]
         
-        citas = self.db.obtener_citas_paciente(paciente_id)
-        for cita in citas:
-            self.citas_tree.insert('', tk.END, values=(cita[2], cita[4], cita[3]))
+        self.datos.pedir(filas_citas, paciente_id, al_terminar=self.mostrar_citas, clave='citas')
+    
+    def mostrar_citas(self, filas):
+        """Rellenar la tabla de citas con filas (id, (fecha, tratamiento, notas))"""
+        self.citas_filas.aplicar(filas)
     
     def actualizar_fotos_paciente(self, paciente_id):
         """Actualizar visualización de fotos del paciente"""
+        # Cancelar las miniaturas pendientes del paciente anterior
+        self.generacion_miniaturas += 1
+        for tarea in self.tareas_miniaturas:
+            tarea.cancel()
+        self.tareas_miniaturas = []
+        
+        # El tramo acaba con la cuadrícula montada; las miniaturas siguen llegando después
+        tramo = instrumentacion.tramo('actualizar_fotos_paciente')
+        self.datos.pedir(Database.obtener_fotos_paciente, paciente_id,
+                         al_terminar=tramo.envolver(self.mostrar_fotos), clave='fotos')
+    
+    def mostrar_fotos(self, fotos):
+        """Montar la cuadrícula de fotos con huecos y decodificar las miniaturas"""
         # Limpiar frame de fotos
         for widget in self.fotos_inner_frame.winfo_children():
             widget.destroy()
         
-        fotos = self.db.obtener_fotos_paciente(paciente_id)
-        
         for i, foto in enumerate(fotos):
             foto_frame = ttk.Frame(self.fotos_inner_frame, relief='solid', borderwidth=1)
             foto_frame.grid(row=i//3, column=i%3, padx=5, pady=5, sticky=(tk.W, tk.E))
             
-            try:
-                # Cargar y mostrar imagen reducida
-                image = Image.open(foto[3])
-                image.thumbnail((150, 150))
-                photo = ImageTk.PhotoImage(image)
-                
-                # Hacer la imagen clickeable
-                label = ttk.Label(foto_frame, image=photo, cursor="hand2")
-                label.image = photo  # Guardar referencia
-                label.grid(row=0, column=0, padx=5, pady=5)
-                
-                # Hacer la imagen clickeable para ampliar
-                label.bind('<Button-1>', lambda e, ruta=foto[3], fotos_lista=fotos: self.mostrar_foto_ampliada(ruta, fotos_lista))
-                
-                ttk.Label(foto_frame, text=foto[2].split()[0]).grid(row=1, column=0)
-                desc_label = ttk.Label(foto_frame, text=foto[4] or "Sin descripción", 
-                                     wraplength=140)
-                desc_label.grid(row=2, column=0)
-                
-            except Exception as e:
-                error_label = ttk.Label(foto_frame, text=f"Error: {e}")
-                error_label.grid(row=0, column=0)
+            # Hueco vacío hasta que la miniatura esté decodificada
+            label = ttk.Label(foto_frame, image=self.miniatura_vacia, cursor="hand2")
+            label.grid(row=0, column=0, padx=5, pady=5)
+            
+            # Hacer la imagen clickeable para ampliar
+            # Por posición: con el almacén dos fotos pueden compartir ruta_archivo
+            label.bind('<Button-1>', lambda e, indice=i, fotos_lista=fotos: self.mostrar_foto_ampliada(indice, fotos_lista))
+            
+            ttk.Label(foto_frame, text=foto.fecha.split()[0]).grid(row=1, column=0)
+            desc_label = ttk.Label(foto_frame, text=foto.descripcion or "Sin descripción", 
+                                 wraplength=140)
+            desc_label.grid(row=2, column=0)
+            
+            # Decodificar la miniatura (o el original si aún no existe) en segundo plano
+            tarea = self.pool_imagenes.submit(cargar_miniatura, foto.ruta_miniatura or foto.ruta_archivo)
+            tarea.add_done_callback(
+                lambda t, label=label, generacion=self.generacion_miniaturas:
+                    self.ejecutar_en_ui(self.mostrar_miniatura, t, label, generacion)
+            )
+            self.tareas_miniaturas.append(tarea)
         
         # Actualizar scrollregion
         self.fotos_inner_frame.update_idletasks()
         self.fotos_canvas.configure(scrollregion=self.fotos_canvas.bbox("all"))
     
+    def mostrar_miniatura(self, tarea, label, generacion):
+        """Sustituir el hueco vacío por la miniatura ya decodificada"""
+        # Descartar resultados de un paciente que ya no está seleccionado
+        if generacion != self.generacion_miniaturas or tarea.cancelled() or not label.winfo_exists():
+            return
+        try:
+            photo = ImageTk.PhotoImage(tarea.result())
+            label.configure(image=photo)
+            label.image = photo  # Guardar referencia
+        except Exception as e:
+            label.configure(image='', text=f"Error: {e}")
+    
     def nuevo_paciente(self):
         """Ventana para agregar nuevo paciente"""
         dialog = tk.Toplevel(self.root)
@@ -374,27 +543,34 @@ class PodologiaApp:
                 messagebox.showerror("Error", "El nombre es obligatorio")
                 return
             
-            paciente_id = self.db.agregar_paciente(
-                nombre,
-                telefono_entry.get(),
-                email_entry.get()
-            )
+            # Etiquetas seleccionadas más la nueva si se especificó
+            etiquetas = [etiqueta for etiqueta, var in etiquetas_seleccionadas.items() if var.get()]
+            etiquetas.append(nueva_etiqueta_entry.get().strip())
+            
+            telefono = telefono_entry.get()
+            email = email_entry.get()
             
-            # Agregar etiquetas seleccionadas
-            for etiqueta, var in etiquetas_seleccionadas.items():
-                if var.get():
-                    self.db.agregar_etiqueta_paciente(paciente_id, etiqueta)
+            # Paciente y etiquetas en una sola transacción, en el hilo de datos
+            def guardar(db):
+                with db.transaccion():
+                    paciente_id = db.agregar_paciente(nombre, telefono, email)
+                    db.sincronizar_etiquetas_paciente(paciente_id, etiquetas)
+                return paciente_id
             
-            # Agregar nueva etiqueta si se especificó
-            nueva_etiqueta = nueva_etiqueta_entry.get().strip()
-            if nueva_etiqueta:
-                self.db.agregar_etiqueta_paciente(paciente_id, nueva_etiqueta)
+            def guardado(paciente_id):
+                self.actualizar_lista_pacientes()
+                dialog.destroy()
+                messagebox.showinfo("Éxito", "Paciente agregado correctamente")
             
-            self.actualizar_lista_pacientes()
-            dialog.destroy()
-            messagebox.showinfo("Éxito", "Paciente agregado correctamente")
+            def fallido(error):
+                boton_guardar.config(state=tk.NORMAL)
+                messagebox.showerror("Error", f"No se pudo agregar el paciente: {error}")
+            
+            boton_guardar.config(state=tk.DISABLED)
+            self.datos.pedir(guardar, al_terminar=guardado, al_fallar=fallido)
         
-        ttk.Button(dialog, text="Guardar", command=guardar_paciente).grid(row=5, column=1, sticky=tk.E, padx=5, pady=10)
+        boton_guardar = ttk.Button(dialog, text="Guardar", command=guardar_paciente)
+        boton_guardar.grid(row=5, column=1, sticky=tk.E, padx=5, pady=10)
         
         dialog.columnconfigure(1, weight=1)
     
@@ -406,31 +582,26 @@ class PodologiaApp:
         
         respuesta = messagebox.askyesno(
             "Confirmar Eliminación", 
-            f"¿Estás seguro de eliminar al paciente {self.paciente_actual[1]}?\n\nEsta acción eliminará también sus citas, fotos y etiquetas."
+            f"¿Estás seguro de eliminar al paciente {self.paciente_actual.nombre}?\n\nEsta acción eliminará también sus citas, fotos y etiquetas."
         )
         
         if respuesta:
-            try:
-                # Primero eliminar las fotos físicas
-                fotos = self.db.obtener_fotos_paciente(self.paciente_actual[0])
-                for foto in fotos:
-                    try:
-                        if os.path.exists(foto[3]):  # ruta_archivo
-                            os.remove(foto[3])
-                    except:
-                        pass
-                
-                # Luego eliminar de la base de datos
-                if self.eliminar_paciente_db(self.paciente_actual[0]):
+            # Citas, fotos y etiquetas caen en cascada; los archivos que nadie más usa
+            # se borran después en el hilo de BorradorArchivos
+            def eliminado(ok):
+                if ok:
                     messagebox.showinfo("Éxito", "Paciente eliminado correctamente")
                     self.actualizar_lista_pacientes()
                     self.paciente_actual = None
-                    self.mostrar_info_paciente(("", "", "", ""))  # Limpiar interfaz
+                    self.mostrar_info_paciente(PACIENTE_VACIO)  # Limpiar interfaz
                 else:
                     messagebox.showerror("Error", "No se pudo eliminar el paciente")
-                    
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al eliminar paciente: {e}")
+            
+            self.datos.pedir(
+                Database.eliminar_paciente, self.paciente_actual.id,
+                al_terminar=eliminado,
+                al_fallar=lambda e: messagebox.showerror("Error", f"Error al eliminar paciente: {e}")
+            )
     
     def agregar_cita(self):
         """Agregar nueva cita"""
@@ -438,61 +609,150 @@ class PodologiaApp:
             messagebox.showwarning("Adverdencia", "Selecciona un paciente primero")
             return
         
-        self.db.agregar_cita(
-            self.paciente_actual[0],
+        paciente_id = self.paciente_actual.id
+        
+        def agregada(cita_id):
+            self.marcar_pestanas_sucias(paciente_id, 'citas')
+            self.notas_cita.delete('1.0', tk.END)
+            self.tratamiento_var.set("")
+            
+            messagebox.showinfo("Éxito", "Cita agregada correctamente")
+        
+        # ValueError si la fecha no es válida
+        self.datos.pedir(
+            Database.agregar_cita,
+            paciente_id,
             self.fecha_cita.get(),
             self.notas_cita.get('1.0', tk.END).strip(),
-            self.tratamiento_var.get()
+            self.tratamiento_var.get(),
+            al_terminar=agregada,
+            al_fallar=lambda e: messagebox.showerror("Error", str(e))
         )
-        
-        self.actualizar_citas_paciente(self.paciente_actual[0])
-        self.notas_cita.delete('1.0', tk.END)
-        self.tratamiento_var.set("")
-        
-        messagebox.showinfo("Éxito", "Cita agregada correctamente")
     
     def seleccionar_foto(self):
-        """Seleccionar archivo de foto"""
-        filename = filedialog.askopenfilename(
-            title="Seleccionar foto",
+        """Seleccionar uno o varios archivos de foto"""
+        filenames = filedialog.askopenfilenames(
+            title="Seleccionar fotos",
             filetypes=[("Imágenes", "*.jpg *.jpeg *.png *.bmp *.gif")]
         )
-        if filename:
-            self.foto_actual = filename
+        if filenames:
+            self.fotos_seleccionadas = list(filenames)
+            self.fotos_seleccionadas_var.set(
+                os.path.basename(filenames[0]) if len(filenames) == 1 else f"{len(filenames)} fotos seleccionadas"
+            )
     
     def subir_foto(self):
-        """Subir foto seleccionada"""
+        """Subir las fotos seleccionadas
+        
+        Copia y variantes van en paralelo en un pool de procesos (decodificar
+        y reducir imágenes es CPU pura); las filas se insertan al final en una
+        sola transacción y la cuadrícula se refresca una única vez.
+        """
         if not self.paciente_actual:
             messagebox.showwarning("Advertencia", "Selecciona un paciente primero")
             return
         
-        if not self.foto_actual:
+        if not self.fotos_seleccionadas:
             messagebox.showwarning("Advertencia", "Selecciona una foto primero")
             return
         
-        # Copiar foto a carpeta data/fotos
-        import shutil
-        filename = os.path.basename(self.foto_actual)
-        nuevo_path = f"data/fotos/{self.paciente_actual[0]}_{filename}"
+        if self.pool_procesos is None:
+            self.pool_procesos = ProcessPoolExecutor(max_workers=min(4, os.cpu_count() or 1))
+        
+        lote = {
+            'paciente_id': self.paciente_actual.id,
+            'descripcion': self.descripcion_foto.get(),
+            'total': len(self.fotos_seleccionadas),
+            'preparadas': [],
+            'errores': [],
+            'cancelado': False,
+            'tramo': instrumentacion.tramo('subir_foto'),
+        }
+        
+        self.boton_subir.config(state=tk.DISABLED)
+        # Un paso por foto y uno más para el registro en la base de datos
+        self.progreso_fotos.config(maximum=lote['total'] + 1, value=0)
+        self.progreso_fotos.grid()
+        
+        tareas = []
+        try:
+            for origen in self.fotos_seleccionadas:
+                tarea = self.pool_procesos.submit(preparar_foto, origen)
+                tareas.append(tarea)
+                tarea.add_done_callback(
+                    lambda tarea, origen=origen: self.ejecutar_en_ui(self.foto_preparada, lote, origen, tarea)
+                )
+        except Exception as e:
+            # p. ej. BrokenProcessPool si un proceso murió en una subida anterior:
+            # se descarta el pool (la próxima subida crea otro) y se anula el lote
+            lote['cancelado'] = True
+            # Cancelar a mano lo ya enviado (shutdown(cancel_futures=...) es de Python 3.9)
+            for tarea in tareas:
+                tarea.cancel()
+            self.pool_procesos.shutdown(wait=False)
+            self.pool_procesos = None
+            self.lote_fotos_terminado(lote, 0, e)
+    
+    def foto_preparada(self, lote, origen, tarea):
+        """Una foto del lote ya está en el almacén (o falló); al terminar todas, registrar"""
+        if lote['cancelado']:
+            # No dejar en el almacén archivos que ninguna foto usa
+            if not tarea.cancelled() and tarea.exception() is None:
+                _, ruta, nueva, *variantes = tarea.result()
+                if nueva:
+                    eliminar_archivos([ruta, *variantes])
+            return
         
         try:
-            shutil.copy2(self.foto_actual, nuevo_path)
-            
-            # Guardar en base de datos
-            self.db.agregar_foto(
-                self.paciente_actual[0],
-                nuevo_path,
-                self.descripcion_foto.get()
-            )
-            
-            self.actualizar_fotos_paciente(self.paciente_actual[0])
-            self.descripcion_foto.delete(0, tk.END)
-            self.foto_actual = None
-            
-            messagebox.showinfo("Éxito", "Foto subida correctamente")
-            
+            lote['preparadas'].append(tarea.result())
         except Exception as e:
-            messagebox.showerror("Error", f"No se pudo subir la foto: {e}")
+            lote['errores'].append(f"{os.path.basename(origen)}: {e}")
+        self.progreso_fotos.step(1)
+        
+        if len(lote['preparadas']) + len(lote['errores']) < lote['total']:
+            return
+        
+        preparadas = lote['preparadas']
+        
+        def registrar(db):
+            try:
+                return db.agregar_fotos(
+                    lote['paciente_id'],
+                    [(hash_archivo, ruta, miniatura, visor) for hash_archivo, ruta, _, miniatura, visor in preparadas],
+                    lote['descripcion']
+                )
+            except Exception:
+                # No dejar en el almacén archivos que ninguna foto usa
+                eliminar_archivos([r for _, ruta, nueva, *variantes in preparadas if nueva for r in (ruta, *variantes)])
+                raise
+        
+        self.datos.pedir(
+            registrar,
+            al_terminar=lambda cuantas: self.lote_fotos_terminado(lote, cuantas),
+            al_fallar=lambda e: self.lote_fotos_terminado(lote, 0, e)
+        )
+    
+    def lote_fotos_terminado(self, lote, cuantas, error=None):
+        """Refrescar la cuadrícula una sola vez e informar del resultado"""
+        self.progreso_fotos.grid_remove()
+        self.boton_subir.config(state=tk.NORMAL)
+        self.marcar_pestanas_sucias(lote['paciente_id'], 'fotos')
+        lote['tramo'].terminar()  # Antes del mensaje, que espera al usuario
+        
+        if error is not None:
+            messagebox.showerror("Error", f"No se pudieron subir las fotos: {error}")
+            return
+        
+        self.descripcion_foto.delete(0, tk.END)
+        self.fotos_seleccionadas = []
+        self.fotos_seleccionadas_var.set("")
+        if lote['errores']:
+            messagebox.showwarning(
+                "Subida incompleta",
+                f"Se subieron {cuantas} de {lote['total']} fotos.\n\n" + "\n".join(lote['errores'])
+            )
+        else:
+            messagebox.showinfo("Éxito", "Foto subida correctamente" if cuantas == 1 else f"{cuantas} fotos subidas correctamente")
     
     def procesar_pregunta_ia(self):
         """Procesar pregunta del asistente IA"""
@@ -502,15 +762,32 @@ class PodologiaApp:
             messagebox.showwarning("Advertencia", "Escribe una pregunta")
             return
         
-        # Aquí integras el asistente de IA
-        try:
-            from asistente_ia import AsistenteIA
-            asistente = AsistenteIA()
-            respuesta = asistente.procesar_pregunta(pregunta)
-        except ImportError:
-            # Si no existe el módulo, mostrar respuesta básica
-            respuesta = f"Pregunta: {pregunta}\n\n(El asistente IA avanzado estará disponible pronto. Por ahora puedo ayudarte con búsquedas básicas en los pacientes)"
+        # Crear el asistente la primera vez y reutilizarlo después
+        if self.asistente is None:
+            try:
+                from asistente_ia import AsistenteIA
+                self.asistente = AsistenteIA(self.db.ruta_db)
+            except ImportError:
+                # Si no existe el módulo, mostrar respuesta básica
+                self.mostrar_respuesta_ia(f"Pregunta: {pregunta}\n\n(El asistente IA avanzado estará disponible pronto. Por ahora puedo ayudarte con búsquedas básicas en los pacientes)")
+                return
         
+        # La consulta se ejecuta en el hilo del asistente para no congelar la ventana
+        self.boton_preguntar.config(state=tk.DISABLED)
+        self.mostrar_respuesta_ia("Consultando...")
+        tarea = self.pool_ia.submit(self.asistente.procesar_pregunta, pregunta)
+        tarea.add_done_callback(lambda t: self.ejecutar_en_ui(self.respuesta_ia_lista, t))
+    
+    def respuesta_ia_lista(self, tarea):
+        """Mostrar la respuesta del asistente (se llama en el hilo de Tk)"""
+        self.boton_preguntar.config(state=tk.NORMAL)
+        if tarea.exception() is not None:
+            self.mostrar_respuesta_ia(f"Error al procesar la pregunta: {tarea.exception()}")
+        else:
+            self.mostrar_respuesta_ia(tarea.result())
+    
+    def mostrar_respuesta_ia(self, respuesta):
+        """Escribir texto en el cuadro de respuesta"""
         self.respuesta_ia.config(state=tk.NORMAL)
         self.respuesta_ia.delete('1.0', tk.END)
         self.respuesta_ia.insert('1.0', respuesta)
@@ -575,20 +852,20 @@ class PodologiaApp:
         ttk.Label(dialog, text="Nombre:*").grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
         nombre_entry = ttk.Entry(dialog, width=30)
         nombre_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        nombre_entry.insert(0, self.paciente_actual[1])
+        nombre_entry.insert(0, self.paciente_actual.nombre)
         
         ttk.Label(dialog, text="Teléfono:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
         telefono_entry = ttk.Entry(dialog, width=30)
         telefono_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        telefono_entry.insert(0, self.paciente_actual[2] or "")
+        telefono_entry.insert(0, self.paciente_actual.telefono or "")
         
         ttk.Label(dialog, text="Email:").grid(row=2, column=0, sticky=tk.W, padx=5, pady=5)
         email_entry = ttk.Entry(dialog, width=30)
         email_entry.grid(row=2, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        email_entry.insert(0, self.paciente_actual[3] or "")
+        email_entry.insert(0, self.paciente_actual.email or "")
         
         # Etiquetas actuales del paciente
-        etiquetas_actuales = self.db.obtener_etiquetas_paciente(self.paciente_actual[0])
+        etiquetas_actuales = self.db.obtener_etiquetas_paciente(self.paciente_actual.id)
 
         ttk.Label(dialog, text="Etiquetas:").grid(row=3, column=0, sticky=tk.W, padx=5, pady=5)
 
@@ -625,100 +902,117 @@ class PodologiaApp:
                 messagebox.showerror("Error", "El nombre es obligatorio")
                 return
             
-            # Actualizar datos básicos del paciente
-            self.actualizar_paciente(
-                self.paciente_actual[0],
-                nombre,
-                telefono_entry.get(),
-                email_entry.get()
-            )
+            # Etiquetas marcadas más la nueva si se especificó
+            etiquetas = [etiqueta for etiqueta, var in etiquetas_seleccionadas.items() if var.get()]
+            etiquetas.append(nueva_etiqueta_entry.get().strip())
             
-            # Actualizar etiquetas
-            etiquetas_a_mantener = []
+            paciente_id = self.paciente_actual.id
+            telefono = telefono_entry.get()
+            email = email_entry.get()
             
-            # Agregar etiquetas seleccionadas
-            for etiqueta, var in etiquetas_seleccionadas.items():
-                if var.get():
-                    etiquetas_a_mantener.append(etiqueta)
-                    if etiqueta not in etiquetas_actuales:
-                        self.db.agregar_etiqueta_paciente(self.paciente_actual[0], etiqueta)
+            # Datos básicos y etiquetas en una sola transacción (un único commit)
+            def guardar(db):
+                with db.transaccion():
+                    if not db.actualizar_paciente(paciente_id, nombre, telefono, email):
+                        raise RuntimeError("no se pudieron actualizar los datos del paciente")
+                    db.sincronizar_etiquetas_paciente(paciente_id, etiquetas)
+                return db.obtener_paciente(paciente_id)
             
-            # Remover etiquetas no seleccionadas
-            for etiqueta in etiquetas_actuales:
-                if etiqueta not in etiquetas_a_mantener:
-                    self.db.eliminar_etiqueta_paciente(self.paciente_actual[0], etiqueta)
+            # Actualizar interfaz con los datos recién guardados
+            def guardado(paciente):
+                self.paciente_actual = paciente
+                self.actualizar_lista_pacientes()
+                self.mostrar_info_paciente(self.paciente_actual)
+                dialog.destroy()
+                messagebox.showinfo("Éxito", "Paciente actualizado correctamente")
             
-            # Agregar nueva etiqueta si se especificó
-            nueva_etiqueta = nueva_etiqueta_entry.get().strip()
-            if nueva_etiqueta:
-                self.db.agregar_etiqueta_paciente(self.paciente_actual[0], nueva_etiqueta)
+            def fallido(error):
+                boton_guardar.config(state=tk.NORMAL)
+                messagebox.showerror("Error", f"No se pudieron guardar los cambios: {error}")
             
-            # Actualizar interfaz
-            self.actualizar_lista_pacientes()
-            self.mostrar_info_paciente(self.paciente_actual)
-            dialog.destroy()
-            messagebox.showinfo("Éxito", "Paciente actualizado correctamente")
+            boton_guardar.config(state=tk.DISABLED)
+            self.datos.pedir(guardar, al_terminar=guardado, al_fallar=fallido)
         
-        ttk.Button(dialog, text="Guardar Cambios", command=guardar_cambios).grid(row=5, column=1, sticky=tk.E, padx=5, pady=10)
+        boton_guardar = ttk.Button(dialog, text="Guardar Cambios", command=guardar_cambios)
+        boton_guardar.grid(row=5, column=1, sticky=tk.E, padx=5, pady=10)
         
         dialog.columnconfigure(1, weight=1)
     
-    def mostrar_foto_ampliada(self, ruta_foto, fotos_lista=None):
-        """Mostrar foto en visor ampliado"""
+    def mostrar_foto_ampliada(self, indice, fotos_lista=None):
+        """Mostrar en el visor ampliado la foto en la posición indice"""
         if not hasattr(self, 'visor') or not self.visor.winfo_exists():
             self.crear_visor_fotos()
         
         # Guardar lista de fotos para navegación
         if fotos_lista:
             self.fotos_visor = fotos_lista
-            # Encontrar el índice de la foto actual
-            for i, foto in enumerate(fotos_lista):
-                if foto[3] == ruta_foto:  # ruta_archivo está en índice 3
-                    self.indice_foto_actual = i
-                    break
+        self.indice_foto_actual = indice
         
         try:
-            # Cargar y mostrar imagen
-            image = Image.open(ruta_foto)
-            
-            # Calcular tamaño máximo para la ventana
-            max_width = 750
-            max_height = 500
+            # Usar la versión del visor ya redimensionada si existe
+            ruta_foto = self.ruta_visor(self.fotos_visor[self.indice_foto_actual])
             
-            # Redimensionar manteniendo aspecto
-            ratio = min(max_width/image.width, max_height/image.height)
-            new_size = (int(image.width * ratio), int(image.height * ratio))
-            image_resized = image.resize(new_size, Image.Resampling.LANCZOS)
+            # Solo se decodifica aquí la primera foto; las vecinas llegan precargadas
+            photo = self.cache_visor.obtener(ruta_foto)
+            if photo is None:
+                photo = self.guardar_en_cache_visor(ruta_foto, cargar_para_visor(ruta_foto))
             
-            photo = ImageTk.PhotoImage(image_resized)
             self.imagen_ampliada_label.configure(image=photo)
             self.imagen_ampliada_label.image = photo  # Guardar referencia
             
+            self.precargar_vecinas()
+            
             # Actualizar título con información de la foto
-            if self.fotos_visor:
-                foto_actual = self.fotos_visor[self.indice_foto_actual]
-                self.visor.title(f"Visor de Fotos ({self.indice_foto_actual + 1}/{len(self.fotos_visor)}) - {foto_actual[4] or 'Sin descripción'}")
+            foto_actual = self.fotos_visor[self.indice_foto_actual]
+            self.visor.title(f"Visor de Fotos ({self.indice_foto_actual + 1}/{len(self.fotos_visor)}) - {foto_actual.descripcion or 'Sin descripción'}")
             
         except Exception as e:
             messagebox.showerror("Error", f"No se pudo cargar la imagen: {e}")
     
+    def ruta_visor(self, foto):
+        """Ruta de la versión del visor, o del original si aún no se generó"""
+        return foto.ruta_visor or foto.ruta_archivo
+    
+    def guardar_en_cache_visor(self, ruta, image):
+        """Convertir a PhotoImage (solo en el hilo de Tk) y guardar en la caché"""
+        photo = ImageTk.PhotoImage(image)
+        self.cache_visor.guardar(ruta, photo, image.width, image.height)
+        return photo
+    
+    def precargar_vecinas(self):
+        """Decodificar en segundo plano las fotos anteriores y siguientes a la actual"""
+        desde = max(0, self.indice_foto_actual - self.fotos_precarga)
+        hasta = min(len(self.fotos_visor), self.indice_foto_actual + self.fotos_precarga + 1)
+        for foto in self.fotos_visor[desde:hasta]:
+            ruta = self.ruta_visor(foto)
+            if ruta in self.cache_visor or ruta in self.precargas_visor:
+                continue
+            self.precargas_visor.add(ruta)
+            tarea = self.pool_imagenes.submit(cargar_para_visor, ruta)
+            tarea.add_done_callback(
+                lambda t, ruta=ruta: self.ejecutar_en_ui(self.precarga_terminada, ruta, t)
+            )
+    
+    def precarga_terminada(self, ruta, tarea):
+        """Guardar en la caché una foto precargada"""
+        self.precargas_visor.discard(ruta)
+        if tarea.cancelled() or tarea.exception() is not None:
+            return
+        self.guardar_en_cache_visor(ruta, tarea.result())
+    
     def foto_anterior(self):
         """Mostrar foto anterior"""
         if not self.fotos_visor or self.indice_foto_actual <= 0:
             return
         
-        self.indice_foto_actual -= 1
-        ruta_foto = self.fotos_visor[self.indice_foto_actual][3]  # ruta_archivo
-        self.mostrar_foto_ampliada(ruta_foto)
+        self.mostrar_foto_ampliada(self.indice_foto_actual - 1)
     
     def foto_siguiente(self):
         """Mostrar foto siguiente"""
         if not self.fotos_visor or self.indice_foto_actual >= len(self.fotos_visor) - 1:
             return
         
-        self.indice_foto_actual += 1
-        ruta_foto = self.fotos_visor[self.indice_foto_actual][3]  # ruta_archivo
-        self.mostrar_foto_ampliada(ruta_foto)
+        self.mostrar_foto_ampliada(self.indice_foto_actual + 1)
 
 # Ejecutar aplicación
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+import os
+import sys
+from collections import OrderedDict
+from PIL import Image
+
+# Variantes reducidas que se generan al subir cada foto. La cuadrícula y el
+# visor leen estas versiones y nunca el original de varios megas.
+CARPETA_MINIATURAS = 'data/fotos/miniaturas'
+CARPETA_VISOR = 'data/fotos/visor'
+TAMANO_MINIATURA = (150, 150)
+TAMANO_VISOR = (750, 500)
+
+
+def rutas_variantes(ruta_original):
+    """(ruta_miniatura, ruta_visor) que corresponden a un archivo original
+
+    Se reparten en subcarpetas por prefijo del nombre, igual que el almacén
+    (miniaturas/ab/cd/abcd....jpg), para que ninguna carpeta crezca demasiado.
+    """
+    nombre = os.path.basename(ruta_original)
+    relativa = f"{nombre[:2]}/{nombre[2:4]}/{nombre}.jpg"
+    return f"{CARPETA_MINIATURAS}/{relativa}", f"{CARPETA_VISOR}/{relativa}"
+
+
+def generar_variantes(ruta_original):
+    """Crear la miniatura y la versión del visor; devuelve (ruta_miniatura, ruta_visor)"""
+    ruta_miniatura, ruta_visor = rutas_variantes(ruta_original)
+    os.makedirs(os.path.dirname(ruta_miniatura), exist_ok=True)
+    os.makedirs(os.path.dirname(ruta_visor), exist_ok=True)
+
+    with Image.open(ruta_original) as imagen:
+        # En JPEG, draft decodifica directamente a escala reducida
+        imagen.draft('RGB', TAMANO_VISOR)
+        visor = imagen.convert('RGB')
+
+    visor.thumbnail(TAMANO_VISOR, Image.Resampling.LANCZOS)
+    _guardar_jpeg(visor, ruta_visor, 90)
+
+    # La miniatura sale de la versión del visor, no del original
+    visor.thumbnail(TAMANO_MINIATURA, Image.Resampling.LANCZOS)
+    _guardar_jpeg(visor, ruta_miniatura, 85)
+
+    return ruta_miniatura, ruta_visor
+
+
+def _guardar_jpeg(imagen, ruta, calidad):
+    """Escribir a un temporal y renombrar: dos procesos con la misma foto no se pisan"""
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    imagen.save(temporal, 'JPEG', quality=calidad)
+    os.replace(temporal, ruta)
+
+
+def cargar_miniatura(ruta):
+    """Decodificar una imagen a tamaño miniatura (pensado para hilos de fondo)"""
+    with Image.open(ruta) as imagen:
+        imagen.draft('RGB', TAMANO_MINIATURA)
+        imagen.thumbnail(TAMANO_MINIATURA)
+        # thumbnail ya fuerza la carga, así que el hilo principal no decodifica nada
+        return imagen.copy()
+
+
+def cargar_para_visor(ruta):
+    """Decodificar una imagen ya ajustada al tamaño del visor (pensado para hilos de fondo)"""
+    with Image.open(ruta) as imagen:
+        # draft reduce la decodificación en JPEG; thumbnail usa reduce() para el resto
+        imagen.draft('RGB', TAMANO_VISOR)
+        imagen.thumbnail(TAMANO_VISOR, Image.Resampling.LANCZOS)
+        return imagen.copy()
+
+
+class CacheImagenes:
+    """Caché LRU de imágenes listas para mostrar, limitada por memoria aproximada"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes_usados = 0
+        self.imagenes = OrderedDict()  # clave -> (imagen, bytes)
+    
+    def __contains__(self, clave):
+        return clave in self.imagenes
+    
+    def obtener(self, clave):
+        """Devolver la imagen (marcándola como reciente) o None"""
+        entrada = self.imagenes.get(clave)
+        if entrada is None:
+            return None
+        self.imagenes.move_to_end(clave)
+        return entrada[0]
+    
+    def guardar(self, clave, imagen, ancho, alto):
+        """Guardar una imagen y expulsar las menos recientes si se pasa del límite"""
+        if clave in self.imagenes:
+            self.bytes_usados -= self.imagenes.pop(clave)[1]
+        tamano = ancho * alto * 4  # RGBA en memoria de Tk
+        self.imagenes[clave] = (imagen, tamano)
+        self.bytes_usados += tamano
+        while self.bytes_usados > self.max_bytes and len(self.imagenes) > 1:
+            self.bytes_usados -= self.imagenes.popitem(last=False)[1][1]
+    
+    def vaciar(self):
+        self.imagenes.clear()
+        self.bytes_usados = 0
+
+
+def regenerar_variantes(db, todas=False):
+    """Generar las variantes de las fotos que no las tienen (o de todas)"""
+    fotos = db.obtener_fotos_sin_variantes(todas)
+    generadas = 0
+    for foto_id, ruta_archivo in fotos:
+        try:
+            ruta_miniatura, ruta_visor = generar_variantes(ruta_archivo)
+            db.actualizar_variantes_foto(foto_id, ruta_miniatura, ruta_visor)
+            generadas += 1
+        except Exception as e:
+            print(f"Error procesando foto {foto_id} ({ruta_archivo}): {e}")
+    print(f"Variantes generadas: {generadas} de {len(fotos)} fotos")
+    return generadas
+
+
+# Completar las variantes de fotos subidas antes de existir este módulo:
+#   python imagenes.py           -> solo las que faltan
+#   python imagenes.py --todas   -> regenerar todas
+if __name__ == "__main__":
+    from database import Database
+
+    db = Database()
+    regenerar_variantes(db, todas='--todas' in sys.argv[1:])
+    db.cerrar_conexion()
@@ -0,0 +1,61 @@
+import argparse
+import csv
+import json
+import sys
+from database import Database
+
+
+def leer_registros(ruta):
+    """Leer un CSV (con cabecera) o un JSONL registro a registro, sin cargarlo entero"""
+    if ruta.endswith('.jsonl') or ruta.endswith('.json'):
+        with open(ruta, encoding='utf-8') as archivo:
+            for linea in archivo:
+                linea = linea.strip()
+                if linea:
+                    yield json.loads(linea)
+    else:
+        with open(ruta, encoding='utf-8-sig', newline='') as archivo:
+            yield from csv.DictReader(archivo)
+
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Importación masiva de pacientes o citas")
+    parser.add_argument('tipo', choices=['pacientes', 'citas'])
+    parser.add_argument('archivo', help="archivo .csv o .jsonl")
+    parser.add_argument('--lote', type=int, default=5000, help="registros por transacción")
+    parser.add_argument('--rechazados', help="CSV donde guardar los registros rechazados")
+    args = parser.parse_args(argumentos)
+
+    salida_rechazados = open(args.rechazados, 'w', encoding='utf-8', newline='') if args.rechazados else None
+    escritor = csv.writer(salida_rechazados) if salida_rechazados else None
+    if escritor:
+        escritor.writerow(['registro', 'motivo', 'datos'])
+
+    def rechazar(numero, registro, motivo):
+        if escritor:
+            escritor.writerow([numero, motivo, json.dumps(registro, ensure_ascii=False)])
+        else:
+            print(f"\nRegistro {numero} rechazado: {motivo}", file=sys.stderr)
+
+    def progreso(resumen):
+        print(f"\rProcesados: {resumen['procesados']}  Insertados: {resumen['insertados']}  "
+              f"Rechazados: {resumen['rechazados']}", end='', flush=True)
+
+    db = Database()
+    try:
+        importar = db.importar_pacientes if args.tipo == 'pacientes' else db.importar_citas
+        resumen = importar(leer_registros(args.archivo), args.lote, progreso, rechazar)
+    finally:
+        db.cerrar_conexion()
+        if salida_rechazados:
+            salida_rechazados.close()
+
+    print(f"\nImportación de {args.tipo} terminada: {resumen['insertados']} registros insertados, "
+          f"{resumen['rechazados']} rechazados")
+
+
+# Ejemplos:
+#   python importar.py pacientes pacientes.csv --rechazados rechazados.csv
+#   python importar.py citas citas.jsonl --lote 20000
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import heapq
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+
+# Similitud mínima (0-1) para que una palabra de la búsqueda case con una del nombre
+SIMILITUD_MINIMA = 0.5
+
+# Reglas fonéticas del español, en orden: todas las grafías de un mismo sonido
+# acaban igual (Giménez/Jiménez -> jimenes, Vázquez/Vasquez -> baskes)
+REGLAS_FONETICAS = [
+    (re.compile(r'(?<!c)h'), ''),           # h muda (salvo en ch)
+    (re.compile(r'qu(?=[ei])'), 'k'),
+    (re.compile(r'gu(?=[ei])'), 'G'),       # g suave de gue/gui, se restaura abajo
+    (re.compile(r'g(?=[ei])'), 'j'),
+    (re.compile(r'G'), 'g'),
+    (re.compile(r'c(?=[ei])'), 's'),
+    (re.compile(r'c(?!h)'), 'k'),
+    (re.compile(r'z'), 's'),
+    (re.compile(r'v|w'), 'b'),
+    (re.compile(r'll'), 'y'),
+    (re.compile(r'y$'), 'i'),
+    (re.compile(r'(.)\1+'), r'\1'),         # letras dobles
+]
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes"""
+    texto = unicodedata.normalize('NFD', texto.lower())
+    return ''.join(c for c in texto if unicodedata.category(c) != 'Mn')
+
+
+@lru_cache(maxsize=65536)  # nombres y apellidos se repiten mucho
+def clave_fonetica(palabra):
+    for patron, sustituto in REGLAS_FONETICAS:
+        palabra = patron.sub(sustituto, palabra)
+    return palabra
+
+
+def palabras_foneticas(texto):
+    return [clave_fonetica(palabra) for palabra in re.findall(r'[a-zñ]+', normalizar(texto))]
+
+
+def trigramas(clave):
+    relleno = f"  {clave} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceNombres:
+    """Índice en memoria de nombres de paciente tolerante a erratas
+
+    Cada palabra del nombre se reduce a su clave fonética. Las claves distintas
+    (el vocabulario, pequeño porque nombres y apellidos se repiten) se indexan
+    por trigramas; cada clave apunta a los pacientes que la contienen. Buscar
+    cuesta lo que el vocabulario parecido más los pacientes que lo usan, no el
+    total de pacientes.
+    """
+
+    def __init__(self):
+        self.nombres = {}                      # id -> nombre
+        self.claves_paciente = {}              # id -> claves fonéticas del nombre
+        self.pacientes = defaultdict(set)      # clave -> ids
+        self.trigramas = defaultdict(set)      # trigrama -> claves
+        self.trigramas_clave = {}              # clave -> número de trigramas
+
+    def __len__(self):
+        return len(self.nombres)
+
+    def construir(self, filas):
+        """Cargar (id, nombre) de un iterable"""
+        for paciente_id, nombre in filas:
+            self.agregar(paciente_id, nombre)
+        return self
+
+    def agregar(self, paciente_id, nombre):
+        """Añadir o reemplazar un paciente"""
+        if paciente_id in self.nombres:
+            self.eliminar(paciente_id)
+        claves = tuple(dict.fromkeys(palabras_foneticas(nombre or '')))
+        self.nombres[paciente_id] = nombre
+        self.claves_paciente[paciente_id] = claves
+        for clave in claves:
+            if clave not in self.trigramas_clave:
+                grupo = trigramas(clave)
+                self.trigramas_clave[clave] = len(grupo)
+                for trigrama in grupo:
+                    self.trigramas[trigrama].add(clave)
+            self.pacientes[clave].add(paciente_id)
+
+    def eliminar(self, paciente_id):
+        if paciente_id not in self.nombres:
+            return
+        del self.nombres[paciente_id]
+        for clave in self.claves_paciente.pop(paciente_id):
+            pacientes = self.pacientes[clave]
+            pacientes.discard(paciente_id)
+            if not pacientes:
+                # Clave sin pacientes: sacarla también del vocabulario
+                del self.pacientes[clave]
+                for trigrama in trigramas(clave):
+                    self.trigramas[trigrama].discard(clave)
+                    if not self.trigramas[trigrama]:
+                        del self.trigramas[trigrama]
+                del self.trigramas_clave[clave]
+
+    def _claves_parecidas(self, palabra):
+        """{clave: similitud} de las claves del vocabulario parecidas a palabra
+
+        Similitud de Dice sobre trigramas; si la clave empieza por la palabra
+        (se está escribiendo) cuenta como casi exacta.
+        """
+        buscados = trigramas(palabra)
+        comunes = defaultdict(int)
+        for trigrama in buscados:
+            for clave in self.trigramas.get(trigrama, ()):
+                comunes[clave] += 1
+
+        parecidas = {}
+        for clave, n in comunes.items():
+            similitud = 2 * n / (len(buscados) + self.trigramas_clave[clave])
+            if clave.startswith(palabra):
+                similitud = max(similitud, 0.85 + 0.15 * len(palabra) / len(clave))
+            if similitud >= SIMILITUD_MINIMA:
+                parecidas[clave] = similitud
+        return parecidas
+
+    def buscar(self, texto, limite=100):
+        """[(id, nombre)] de los pacientes cuyo nombre se parece a texto, de más a menos parecido
+
+        Cada palabra buscada tiene que parecerse a alguna palabra del nombre.
+        """
+        palabras = list(dict.fromkeys(palabras_foneticas(texto)))
+        if not palabras:
+            return []
+
+        grupos = [self._claves_parecidas(palabra) for palabra in palabras]
+        if not all(grupos):
+            return []
+        # Empezar por la palabra con menos pacientes candidatos
+        grupos.sort(key=lambda grupo: sum(len(self.pacientes[clave]) for clave in grupo))
+
+        puntuacion = {}
+        anterior = None
+        for clave, similitud in sorted(grupos[0].items(), key=lambda item: -item[1]):
+            # Con una sola palabra, en cuanto hay bastantes y baja la similitud ya no
+            # entra nadie más en el resultado (evita recorrer medio índice con "m")
+            if len(grupos) == 1 and len(puntuacion) >= limite and similitud < anterior:
+                break
+            anterior = similitud
+            for paciente_id in self.pacientes[clave]:
+                if similitud > puntuacion.get(paciente_id, 0):
+                    puntuacion[paciente_id] = similitud
+
+        # Las demás palabras solo filtran a los candidatos que ya hay
+        for grupo in grupos[1:]:
+            siguiente = {}
+            for paciente_id, total in puntuacion.items():
+                mejor = max((grupo.get(clave, 0) for clave in self.claves_paciente[paciente_id]), default=0)
+                if mejor:
+                    siguiente[paciente_id] = total + mejor
+            puntuacion = siguiente
+
+        mejores = heapq.nsmallest(
+            limite, puntuacion.items(),
+            key=lambda item: (-item[1], self.nombres[item[0]], item[0])
+        )
+        return [(paciente_id, self.nombres[paciente_id]) for paciente_id, _ in mejores]
@@ -0,0 +1,290 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Instrumentación opcional: desactivada no cuesta nada (conexiones y cursores normales).
+#   PODOLOGIA_INSTRUMENTACION=1   activa la medición
+#   PODOLOGIA_UMBRAL_LENTO_MS=100 registra las sentencias más lentas que esto con su plan
+#   PODOLOGIA_METRICAS=ruta.json  exporta el resumen al cerrar la aplicación
+ACTIVA = os.environ.get('PODOLOGIA_INSTRUMENTACION', '') not in ('', '0')
+UMBRAL_LENTO_MS = float(os.environ.get('PODOLOGIA_UMBRAL_LENTO_MS', 100))
+ARCHIVO_METRICAS = os.environ.get('PODOLOGIA_METRICAS')
+
+# Límites superiores (ms) de los cubos de los histogramas
+CUBOS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# Sentencias lentas guardadas para el resumen (las más recientes)
+MAX_LENTAS = 200
+
+_bloqueo = threading.Lock()
+_sentencias = {}   # (origen, sql) -> Histograma
+_tramos = {}       # nombre -> Histograma
+_lentas = []
+_planes = {}       # sql -> plan ya capturado
+
+
+def activar(umbral_ms=None):
+    """Activar la instrumentación desde código (las conexiones abiertas antes no se miden)"""
+    global ACTIVA, UMBRAL_LENTO_MS
+    ACTIVA = True
+    if umbral_ms is not None:
+        UMBRAL_LENTO_MS = umbral_ms
+
+
+class Histograma:
+    """Recuento, total, máximo y reparto por cubos de CUBOS_MS"""
+
+    def __init__(self):
+        self.n = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.cubos = [0] * (len(CUBOS_MS) + 1)  # el último cubo es "más de 5 s"
+
+    def registrar(self, ms):
+        self.n += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        for i, limite in enumerate(CUBOS_MS):
+            if ms <= limite:
+                self.cubos[i] += 1
+                return
+        self.cubos[-1] += 1
+
+    def percentil(self, p):
+        """Aproximación: límite superior del cubo donde cae el percentil p"""
+        if not self.n:
+            return None
+        objetivo = p / 100 * self.n
+        acumulado = 0
+        for i, cantidad in enumerate(self.cubos):
+            acumulado += cantidad
+            if acumulado >= objetivo:
+                return CUBOS_MS[i] if i < len(CUBOS_MS) else self.max_ms
+        return self.max_ms
+
+    def resumen(self):
+        return {
+            'n': self.n,
+            'media_ms': round(self.total_ms / self.n, 3) if self.n else None,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentil(50),
+            'p95_ms': self.percentil(95),
+            'p99_ms': self.percentil(99),
+            'cubos_ms': {(f"<={limite}" if i < len(CUBOS_MS) else f">{CUBOS_MS[-1]}"): cantidad
+                         for i, (limite, cantidad) in enumerate(zip(CUBOS_MS + (None,), self.cubos))},
+        }
+
+
+def _registrar(tabla, clave, ms):
+    with _bloqueo:
+        histograma = tabla.get(clave)
+        if histograma is None:
+            histograma = tabla[clave] = Histograma()
+        histograma.registrar(ms)
+
+
+# --- SENTENCIAS SQL ---
+
+def _normalizar(sql):
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class CursorMedido(sqlite3.Cursor):
+    """Cursor que mide cada sentencia desde execute hasta la primera lectura de resultados
+
+    sqlite3 solo avisa del inicio de cada sentencia (set_trace_callback), no de
+    su fin, así que el tiempo se toma aquí: execute más la fetch* que le sigue.
+    """
+
+    def execute(self, sql, parametros=()):
+        self._cerrar_medicion()
+        inicio = time.perf_counter()
+        resultado = super().execute(sql, parametros)
+        tiempo = time.perf_counter() - inicio
+        if self.description is None:
+            # Sin filas que leer (INSERT, UPDATE, PRAGMA de escritura...): ya terminó
+            self.connection._sentencia(sql, parametros, tiempo * 1000)
+        else:
+            self._medicion = (sql, parametros, tiempo)
+        return resultado
+
+    def executemany(self, sql, parametros):
+        self._cerrar_medicion()
+        inicio = time.perf_counter()
+        resultado = super().executemany(sql, parametros)
+        self.connection._sentencia(sql, None, (time.perf_counter() - inicio) * 1000)
+        return resultado
+
+    def fetchone(self):
+        return self._leer(super().fetchone)
+
+    def fetchmany(self, *args):
+        return self._leer(super().fetchmany, *args)
+
+    def fetchall(self):
+        return self._leer(super().fetchall)
+
+    def _leer(self, lectura, *args):
+        inicio = time.perf_counter()
+        filas = lectura(*args)
+        self._cerrar_medicion(time.perf_counter() - inicio)
+        return filas
+
+    def _cerrar_medicion(self, tiempo_lectura=0.0):
+        """Registrar la sentencia pendiente (si se recorrió sin fetch*, solo cuenta execute)"""
+        medicion = getattr(self, '_medicion', None)
+        if medicion:
+            self._medicion = None
+            sql, parametros, tiempo_execute = medicion
+            self.connection._sentencia(sql, parametros, (tiempo_execute + tiempo_lectura) * 1000)
+
+
+class ConexionMedida(sqlite3.Connection):
+    """Conexión cuyos cursores (incluidos los de conn.execute) y commits se miden"""
+
+    origen = 'sqlite'
+
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def commit(self):
+        inicio = time.perf_counter()
+        super().commit()
+        self._sentencia('COMMIT', None, (time.perf_counter() - inicio) * 1000)
+
+    def _sentencia(self, sql, parametros, ms):
+        sql = _normalizar(sql)
+        _registrar(_sentencias, (self.origen, sql), ms)
+        if ms >= UMBRAL_LENTO_MS:
+            plan = self._plan(sql, parametros)
+            lenta = {
+                'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'origen': self.origen,
+                'ms': round(ms, 3),
+                'sql': sql,
+                'plan': plan,
+            }
+            with _bloqueo:
+                _lentas.append(lenta)
+                del _lentas[:-MAX_LENTAS]
+            # Los parámetros no se registran: contienen datos de pacientes
+            print(f"Consulta lenta ({self.origen}, {ms:.1f} ms): {sql}", file=sys.stderr)
+            for linea in plan:
+                print(f"    {linea}", file=sys.stderr)
+
+    def _plan(self, sql, parametros):
+        """EXPLAIN QUERY PLAN de la sentencia (una vez por texto de SQL)"""
+        if sql in _planes:
+            return _planes[sql]
+        if parametros is None or not re.match(r'(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b', sql, re.I):
+            return []
+        try:
+            # Cursor sin medir para no registrar el propio EXPLAIN
+            filas = super().cursor().execute(f'EXPLAIN QUERY PLAN {sql}', parametros).fetchall()
+            plan = [f"{fila[0]}:{fila[1]} {fila[-1]}" for fila in filas]
+        except sqlite3.Error as e:
+            plan = [f"(sin plan: {e})"]
+        _planes[sql] = plan
+        return plan
+
+
+def conectar(ruta, origen='sqlite', **kwargs):
+    """sqlite3.connect que devuelve una ConexionMedida si la instrumentación está activa"""
+    if not ACTIVA:
+        return sqlite3.connect(ruta, **kwargs)
+    conn = sqlite3.connect(ruta, factory=ConexionMedida, **kwargs)
+    conn.origen = origen
+    return conn
+
+
+# --- TRAMOS DE LA INTERFAZ ---
+
+class Tramo:
+    """Latencia de una acción, de principio a fin aunque termine en un callback"""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.inicio = time.perf_counter()
+        self.terminado = False
+
+    def terminar(self):
+        if not self.terminado:
+            self.terminado = True
+            _registrar(_tramos, self.nombre, (time.perf_counter() - self.inicio) * 1000)
+
+    def envolver(self, funcion):
+        """Devolver funcion de forma que el tramo termine cuando ella acabe"""
+        def envuelta(*args, **kwargs):
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                self.terminar()
+        return envuelta
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.terminar()
+
+
+class _TramoInactivo:
+    def terminar(self):
+        pass
+
+    def envolver(self, funcion):
+        return funcion
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_TRAMO_INACTIVO = _TramoInactivo()
+
+
+def tramo(nombre):
+    """Empezar a medir una acción; usar con with o terminar con envolver()/terminar()
+
+    Los tramos que nunca terminan (peticiones superadas) no se cuentan.
+    """
+    return Tramo(nombre) if ACTIVA else _TRAMO_INACTIVO
+
+
+# --- RESUMEN ---
+
+def resumen():
+    """Histogramas de sentencias y tramos, y últimas sentencias lentas"""
+    with _bloqueo:
+        sentencias = sorted(_sentencias.items(), key=lambda item: item[1].total_ms, reverse=True)
+        return {
+            'fecha': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'umbral_lento_ms': UMBRAL_LENTO_MS,
+            'tramos': {nombre: h.resumen() for nombre, h in sorted(_tramos.items())},
+            'sentencias': [dict(origen=origen, sql=sql, **h.resumen()) for (origen, sql), h in sentencias],
+            'lentas': list(_lentas),
+        }
+
+
+def exportar(ruta=None):
+    """Guardar resumen() en JSON; devuelve la ruta o None si no hay dónde guardarlo"""
+    ruta = ruta or ARCHIVO_METRICAS
+    if not ruta:
+        return None
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(resumen(), archivo, indent=2, ensure_ascii=False)
+    return ruta
+
+
+def reiniciar():
+    with _bloqueo:
+        _sentencias.clear()
+        _tramos.clear()
+        _lentas.clear()
@@ -0,0 +1,250 @@
+import tkinter as tk
+from tkinter import ttk, font
+from reconciliar import ReconciliadorListbox
+
+
+class ListaPacientesVirtual(ttk.Frame):
+    """Lista de pacientes que solo carga y dibuja la ventana visible
+
+    Las filas se piden a la base de datos por páginas en orden (nombre, id).
+    Se guarda en memoria la ventana visible más un margen a cada lado, así que
+    el coste de refrescar o desplazarse no depende del total de pacientes.
+    Los resultados de una búsqueda por parecido (ver mostrar_resultados), que
+    solo se usa cuando no hay coincidencias, vienen ya limitados y ordenados,
+    y se muestran tal cual sin paginar.
+    """
+
+    def __init__(self, parent, db, al_seleccionar=None, margen=50, **kwargs):
+        super().__init__(parent)
+        self.db = db
+        self.al_seleccionar = al_seleccionar
+        self.margen = margen
+
+        # Estado de la ventana
+        self.texto = None          # Filtro de búsqueda actual
+        self.resultados = None     # Filas fijas de una búsqueda por parecido (None = paginar)
+        self.total = 0             # Total de filas que cumplen el filtro
+        self.inicio = 0            # Posición de la primera fila visible
+        self.visibles = kwargs.get('height', 20)
+        self.filas = []            # Filas (FilaPaciente) cargadas en memoria
+        self.filas_inicio = 0      # Posición de self.filas[0] dentro del total
+        self.seleccion_id = None
+
+        self.listbox = tk.Listbox(self, exportselection=False, **kwargs)
+        # Al desplazar o refrescar solo se tocan las líneas que cambian
+        self.lineas = ReconciliadorListbox(self.listbox)
+        self.listbox.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._scroll)
+        self.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+
+        self.alto_linea = font.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+
+        self.listbox.bind('<<ListboxSelect>>', self._seleccion_cambiada)
+        self.listbox.bind('<Configure>', self._redimensionar)
+        self.listbox.bind('<MouseWheel>', lambda e: self._mover_rueda(-1 if e.delta > 0 else 1))
+        self.listbox.bind('<Button-4>', lambda e: self._mover_rueda(-1))
+        self.listbox.bind('<Button-5>', lambda e: self._mover_rueda(1))
+        self.listbox.bind('<Up>', lambda e: self._mover_seleccion(-1))
+        self.listbox.bind('<Down>', lambda e: self._mover_seleccion(1))
+        self.listbox.bind('<Prior>', lambda e: self._scroll('scroll', -1, 'pages') or 'break')
+        self.listbox.bind('<Next>', lambda e: self._scroll('scroll', 1, 'pages') or 'break')
+
+    # --- API PÚBLICA ---
+
+    def filtrar(self, texto):
+        """Mostrar solo los pacientes que coinciden con texto (vacío = todos)"""
+        self.texto = texto or None
+        self.resultados = None
+        self.inicio = 0
+        self.refrescar()
+
+    def aplicar_filtro(self, texto, total, filas):
+        """Mostrar un filtro cuyo total y primera página ya se consultaron fuera
+
+        filas debe empezar en la posición 0 (ver tamano_carga).
+        """
+        self.texto = texto or None
+        self.resultados = None
+        self.total = total
+        self.filas = list(filas)
+        self.filas_inicio = 0
+        self._mover(0)
+
+    def mostrar_resultados(self, texto, filas):
+        """Mostrar filas (FilaPaciente) ya ordenadas por relevancia, en ese orden"""
+        self.texto = texto or None
+        self.resultados = list(filas)
+        self.total = len(self.resultados)
+        self.filas = self.resultados
+        self.filas_inicio = 0
+        self._mover(0)
+
+    def tamano_carga(self):
+        """Número de filas que se cargan de una vez en un salto"""
+        return self.visibles + 2 * self.margen
+
+    def refrescar(self):
+        """Volver a leer el total y la ventana actual (tras altas, ediciones o bajas)
+
+        Con resultados fijos no hay nada que releer: hay que repetir la búsqueda.
+        """
+        if self.resultados is not None:
+            self._mover(self.inicio)
+            return
+        self.total = self.db.contar_pacientes(self.texto)
+        self.filas = []
+        self.filas_inicio = 0
+        self._mover(self.inicio, forzar_carga=True)
+
+    def id_seleccionado(self):
+        """ID del paciente seleccionado o None"""
+        return self.seleccion_id
+
+    def seleccionar_primero(self):
+        """Seleccionar la primera fila; devuelve su ID o None si la lista está vacía"""
+        self._mover(0)
+        if not self.filas:
+            return None
+        self.seleccion_id = self.filas[0].id
+        self._dibujar()
+        return self.seleccion_id
+
+    # --- CARGA DE FILAS ---
+
+    def _mover(self, inicio, forzar_carga=False):
+        """Colocar la ventana visible en la posición inicio, cargando lo necesario"""
+        inicio = max(0, min(inicio, self.total - self.visibles))
+        fin = min(inicio + self.visibles, self.total)
+        filas_fin = self.filas_inicio + len(self.filas)
+
+        if forzar_carga or not self.filas:
+            self._cargar_desde(inicio)
+        elif inicio < self.filas_inicio:
+            if self.filas_inicio - inicio <= self.margen:
+                self._cargar_anteriores()
+            else:
+                self._cargar_desde(inicio)
+        elif fin > filas_fin:
+            if fin - filas_fin <= self.margen:
+                self._cargar_siguientes()
+            else:
+                self._cargar_desde(inicio)
+
+        self.inicio = inicio
+        self._dibujar()
+
+    def _cargar_desde(self, inicio):
+        """Salto directo (barra de scroll o refresco): única carga con OFFSET"""
+        if self.resultados is not None:
+            # Ya está todo en memoria
+            self.filas = self.resultados
+            self.filas_inicio = 0
+            return
+        desde = max(0, inicio - self.margen)
+        self.filas = self.db.obtener_pacientes_pagina(
+            self.texto, desplazamiento=desde, limite=self.tamano_carga()
+        )
+        self.filas_inicio = desde
+
+    def _cargar_siguientes(self):
+        """Añadir una página al final usando la última clave cargada"""
+        ultima = self.filas[-1]
+        nuevas = self.db.obtener_pacientes_pagina(
+            self.texto, despues=(ultima.nombre, ultima.id), limite=self.margen
+        )
+        self.filas.extend(nuevas)
+        # Descartar por delante lo que ya no hace falta para no crecer sin límite
+        sobrante = len(self.filas) - (self.visibles + 3 * self.margen)
+        if sobrante > 0:
+            del self.filas[:sobrante]
+            self.filas_inicio += sobrante
+
+    def _cargar_anteriores(self):
+        """Añadir una página al principio usando la primera clave cargada"""
+        primera = self.filas[0]
+        nuevas = self.db.obtener_pacientes_pagina(
+            self.texto, antes=(primera.nombre, primera.id), limite=self.margen
+        )
+        self.filas[:0] = nuevas
+        self.filas_inicio -= len(nuevas)
+        sobrante = len(self.filas) - (self.visibles + 3 * self.margen)
+        if sobrante > 0:
+            del self.filas[-sobrante:]
+
+    # --- DIBUJO ---
+
+    def _dibujar(self):
+        """Pintar en el Listbox solo las filas visibles"""
+        desde = self.inicio - self.filas_inicio
+        ventana = self.filas[desde:desde + self.visibles]
+
+        self.lineas.aplicar((fila.id, f"{fila.id} - {fila.nombre}") for fila in ventana)
+
+        self.listbox.selection_clear(0, tk.END)
+        for i, fila in enumerate(ventana):
+            if fila.id == self.seleccion_id:
+                self.listbox.selection_set(i)
+                self.listbox.activate(i)
+                break
+
+        if self.total:
+            self.scrollbar.set(self.inicio / self.total, (self.inicio + len(ventana)) / self.total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _fila_visible(self, indice):
+        posicion = self.inicio - self.filas_inicio + indice
+        if 0 <= posicion < len(self.filas):
+            return self.filas[posicion]
+        return None
+
+    # --- EVENTOS ---
+
+    def _scroll(self, accion, cantidad=None, unidad=None):
+        """Comando de la barra: ('moveto', fracción) o ('scroll', n, 'units'|'pages')"""
+        if accion == 'moveto':
+            self._mover(int(float(cantidad) * self.total))
+        elif accion == 'scroll':
+            paso = self.visibles if unidad == 'pages' else 1
+            self._mover(self.inicio + int(cantidad) * paso)
+
+    def _mover_rueda(self, direccion):
+        self._mover(self.inicio + direccion * 3)
+        return 'break'
+
+    def _mover_seleccion(self, direccion):
+        """Flechas: mover la selección y desplazar la ventana al llegar al borde"""
+        actual = self.listbox.curselection()
+        indice = actual[0] + direccion if actual else 0
+        if indice < 0:
+            self._mover(self.inicio - 1)
+            indice = 0
+        elif indice >= self.listbox.size():
+            self._mover(self.inicio + 1)
+            indice = self.listbox.size() - 1
+
+        fila = self._fila_visible(indice)
+        if fila:
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(indice)
+            self.listbox.activate(indice)
+            self.listbox.event_generate('<<ListboxSelect>>')
+        return 'break'
+
+    def _seleccion_cambiada(self, event):
+        seleccion = self.listbox.curselection()
+        if not seleccion:
+            return
+        fila = self._fila_visible(seleccion[0])
+        if fila:
+            self.seleccion_id = fila.id
+            if self.al_seleccionar:
+                self.al_seleccionar(event)
+
+    def _redimensionar(self, event):
+        visibles = max(1, event.height // self.alto_linea)
+        if visibles != self.visibles:
+            self.visibles = visibles
+            self._mover(self.inicio)
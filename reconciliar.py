@@ -0,0 +1,174 @@
+class Reconciliador:
+    """Lleva un widget de su contenido actual a uno nuevo tocando solo lo que cambia
+
+    Se le pasan filas (clave, valores) en el orden deseado. Guarda en memoria
+    el orden y los valores mostrados, así que calcular la diferencia no hace
+    ninguna llamada a Tk; después solo se borran, insertan, mueven o
+    actualizan las filas que cambiaron. Las subclases aplican cada operación
+    a su tipo de widget.
+    """
+
+    def __init__(self):
+        self.orden = []     # Claves en el orden mostrado
+        self.valores = {}   # clave -> valores mostrados
+
+    def aplicar(self, filas):
+        """Mostrar filas; devuelve el número de operaciones hechas sobre el widget"""
+        filas = list(filas)
+        nuevas = {clave for clave, _ in filas}
+        if len(nuevas) != len(filas):
+            raise ValueError("Las claves de las filas deben ser únicas")
+        cambios = 0
+
+        # Contenido completamente nuevo (p. ej. otro paciente): vaciar de una vez
+        if self.orden and nuevas.isdisjoint(self.orden):
+            self._borrar_todo()
+            self.orden = []
+            self.valores = {}
+            cambios += 1
+
+        # Borrados, de atrás hacia delante para que los índices sigan valiendo
+        for i in range(len(self.orden) - 1, -1, -1):
+            clave = self.orden[i]
+            if clave not in nuevas:
+                self._borrar(i, clave)
+                del self.orden[i]
+                del self.valores[clave]
+                cambios += 1
+
+        for i, (clave, valores) in enumerate(filas):
+            if i < len(self.orden) and self.orden[i] == clave:
+                if self.valores[clave] != valores:
+                    self._actualizar(i, clave, valores)
+                    cambios += 1
+            elif clave in self.valores:
+                desde = self.orden.index(clave, i)
+                self._mover(desde, i, clave, valores)
+                del self.orden[desde]
+                self.orden.insert(i, clave)
+                cambios += 1
+            else:
+                self._insertar(i, clave, valores)
+                self.orden.insert(i, clave)
+                cambios += 1
+            self.valores[clave] = valores
+
+        self._terminar()
+        return cambios
+
+    def vaciar(self):
+        return self.aplicar([])
+
+    # Operaciones sobre el widget (índices referidos al orden actual)
+    def _insertar(self, indice, clave, valores):
+        raise NotImplementedError
+
+    def _actualizar(self, indice, clave, valores):
+        raise NotImplementedError
+
+    def _mover(self, desde, hasta, clave, valores):
+        raise NotImplementedError
+
+    def _borrar(self, indice, clave):
+        raise NotImplementedError
+
+    def _borrar_todo(self):
+        for i in range(len(self.orden) - 1, -1, -1):
+            self._borrar(i, self.orden[i])
+
+    def _terminar(self):
+        pass
+
+
+class ReconciliadorListbox(Reconciliador):
+    """Listbox: valores es el texto de la línea"""
+
+    def __init__(self, listbox):
+        super().__init__()
+        self.listbox = listbox
+
+    def _insertar(self, indice, clave, valores):
+        self.listbox.insert(indice, valores)
+
+    def _actualizar(self, indice, clave, valores):
+        # Listbox no permite cambiar el texto de una línea: se reemplaza
+        self.listbox.delete(indice)
+        self.listbox.insert(indice, valores)
+
+    def _mover(self, desde, hasta, clave, valores):
+        self.listbox.delete(desde)
+        self.listbox.insert(hasta, valores)
+
+    def _borrar(self, indice, clave):
+        self.listbox.delete(indice)
+
+    def _borrar_todo(self):
+        self.listbox.delete(0, 'end')
+
+
+class ReconciliadorTreeview(Reconciliador):
+    """Filas de primer nivel de un Treeview: valores es la tupla de columnas, el iid es la clave"""
+
+    def __init__(self, tree):
+        super().__init__()
+        self.tree = tree
+
+    def _insertar(self, indice, clave, valores):
+        self.tree.insert('', indice, iid=str(clave), values=valores)
+
+    def _actualizar(self, indice, clave, valores):
+        self.tree.item(str(clave), values=valores)
+
+    def _mover(self, desde, hasta, clave, valores):
+        self.tree.move(str(clave), '', hasta)
+        if self.valores[clave] != valores:
+            self.tree.item(str(clave), values=valores)
+
+    def _borrar(self, indice, clave):
+        self.tree.delete(str(clave))
+
+    def _borrar_todo(self):
+        self.tree.delete(*[str(clave) for clave in self.orden])
+
+
+class ReconciliadorHijos(Reconciliador):
+    """Widgets hijos de un frame colocados en una fila con grid (p. ej. etiquetas)
+
+    crear(frame, valores) devuelve el widget nuevo; actualizar(widget, valores)
+    lo modifica (si no se indica, se destruye y se crea otra vez).
+    """
+
+    def __init__(self, frame, crear, actualizar=None, **opciones_grid):
+        super().__init__()
+        self.frame = frame
+        self.crear = crear
+        self.actualizar_widget = actualizar
+        self.opciones_grid = opciones_grid
+        self.widgets = {}    # clave -> widget
+        self.columnas = {}   # clave -> columna en la que está colocado
+
+    def _insertar(self, indice, clave, valores):
+        self.widgets[clave] = self.crear(self.frame, valores)
+
+    def _actualizar(self, indice, clave, valores):
+        if self.actualizar_widget:
+            self.actualizar_widget(self.widgets[clave], valores)
+        else:
+            self.widgets[clave].destroy()
+            self.columnas.pop(clave, None)
+            self.widgets[clave] = self.crear(self.frame, valores)
+
+    def _mover(self, desde, hasta, clave, valores):
+        if self.valores[clave] != valores:
+            self._actualizar(hasta, clave, valores)
+
+    def _borrar(self, indice, clave):
+        self.widgets.pop(clave).destroy()
+        self.columnas.pop(clave, None)
+
+    def _terminar(self):
+        # Recolocar solo los widgets que cambiaron de columna
+        for columna, clave in enumerate(self.orden):
+            if self.columnas.get(clave) != columna:
+                self.widgets[clave].grid(row=0, column=columna, **self.opciones_grid)
+                self.columnas[clave] = columna
@@ -0,0 +1,32 @@
+from collections import namedtuple
+
+# --- REGISTROS DE LA BASE DE DATOS ---
+# Cada lectura de Database devuelve uno de estos registros en lugar de la fila
+# de SELECT *: se consultan solo sus columnas (ver columnas) y se leen por
+# nombre (paciente.nombre, foto.ruta_archivo). Son tuplas con nombre, así que
+# no tienen __dict__ (__slots__ vacío) y ocupan lo mismo que una tupla.
+
+# Ficha completa de un paciente (obtener_paciente)
+Paciente = namedtuple('Paciente', 'id nombre telefono email fecha_nacimiento direccion fecha_registro')
+
+# Paciente en listados y búsquedas con datos de contacto
+ResumenPaciente = namedtuple('ResumenPaciente', 'id nombre telefono email')
+
+# Línea de la lista de pacientes (páginas y búsqueda por parecido)
+FilaPaciente = namedtuple('FilaPaciente', 'id nombre')
+
+# fecha es el texto tal como se escribió; fecha_hora, la normalizada para ordenar
+Cita = namedtuple('Cita', 'id paciente_id fecha fecha_hora tratamiento notas')
+
+Foto = namedtuple('Foto', 'id fecha descripcion ruta_archivo ruta_miniatura ruta_visor')
+
+Estadisticas = namedtuple('Estadisticas', 'citas pacientes_distintos pacientes_nuevos')
+
+# Para limpiar la ficha cuando no hay paciente seleccionado
+PACIENTE_VACIO = Paciente._make([''] * len(Paciente._fields))
+
+
+def columnas(registro, alias=None):
+    """Columnas de un registro para un SELECT ('id, nombre' o 'p.id, p.nombre' con alias)"""
+    prefijo = f'{alias}.' if alias else ''
+    return ', '.join(prefijo + campo for campo in registro._fields)